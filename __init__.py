@@ -1,46 +1,72 @@
 from typing import Any
 
 from .high_level.blender import Blender as HighLevelBlender
+from .high_level.blender_sweep import BlenderSweep as HighLevelBlenderSweep
 from .high_level.box import Box as HighLevelBox
+from .high_level.box_multiple import BoxMultiple as HighLevelBoxMultiple
+from .high_level.compose import ComposeCutouts as HighLevelComposeCutouts
 from .high_level.eraser import Eraser as HighLevelEraser
 from .high_level.name import InferMainSubject as HighLevelInferMainSubject
 from .high_level.recolor import Recolor as HighLevelRecolor
+from .high_level.recolor_multiple import RecolorMultiple as HighLevelRecolorMultiple
+from .high_level.remove_background import RemoveBackground as HighLevelRemoveBackground
 from .high_level.segment import Segment as HighLevelSegment
+from .high_level.segment_multiple import SegmentMultiple as HighLevelSegmentMultiple
 from .high_level.shadow import Shadow as HighLevelShadow
 from .low_level.blender import Blender as LowLevelBlender
 from .low_level.box import Box as LowLevelBox
+from .low_level.create_state_from_url import CreateStateFromURL as LowLevelCreateStateFromURL
 from .low_level.download_image import DownloadImage as LowLevelDownloadImage
 from .low_level.download_mask import DownloadMask as LowLevelDownloadMask
 from .low_level.eraser import Eraser as LowLevelEraser
+from .low_level.merge_masks import MergeMasks as LowLevelMergeMasks
 from .low_level.recolor import Recolor as LowLevelRecolor
+from .low_level.save_image import SaveImage as LowLevelSaveImage
 from .low_level.segment import Segment as LowLevelSegment
 from .low_level.shadow import Shadow as LowLevelShadow
+from .low_level.upload_file import UploadFile as LowLevelUploadFile
 from .low_level.upload_image import UploadImage as LowLevelUploadImage
 from .low_level.upload_mask import UploadMask as LowLevelUploadMask
+from .utils import graph, speculative
 from .utils.bbox import CreateBoundingBox, DrawBoundingBox, ImageCropBoundingBox, MaskCropBoundingBox
 from .utils.image import ApplyTransparencyMask
 
+try:
+    from server import PromptServer  # type: ignore
+except ImportError:  # not running inside ComfyUI
+    PromptServer = None
+
 NODE_CLASS_MAPPINGS: dict[str, Any] = {
     c.TITLE: c
     for c in [
         # low level nodes
         LowLevelBlender,
         LowLevelBox,
+        LowLevelCreateStateFromURL,
         LowLevelDownloadImage,
         LowLevelDownloadMask,
         LowLevelEraser,
+        LowLevelMergeMasks,
         LowLevelRecolor,
+        LowLevelSaveImage,
         LowLevelSegment,
         LowLevelShadow,
+        LowLevelUploadFile,
         LowLevelUploadImage,
         LowLevelUploadMask,
         # high level nodes
         HighLevelBlender,
+        HighLevelBlenderSweep,
         HighLevelBox,
+        HighLevelBoxMultiple,
+        HighLevelComposeCutouts,
         HighLevelEraser,
         HighLevelInferMainSubject,
         HighLevelRecolor,
+        HighLevelRecolorMultiple,
+        HighLevelRemoveBackground,
         HighLevelSegment,
+        HighLevelSegmentMultiple,
         HighLevelShadow,
         # utils nodes
         CreateBoundingBox,
@@ -52,4 +78,9 @@ NODE_CLASS_MAPPINGS: dict[str, Any] = {
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {k: k for k, _ in NODE_CLASS_MAPPINGS.items()}
+
+if PromptServer is not None:
+    PromptServer.instance.add_on_prompt_handler(graph.on_prompt)  # type: ignore
+    PromptServer.instance.add_on_prompt_handler(speculative.on_prompt)  # type: ignore
+
 __all__ = ["NODE_CLASS_MAPPINGS", "NODE_DISPLAY_NAME_MAPPINGS"]
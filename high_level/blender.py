@@ -1,10 +1,11 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from typing import Any, get_args
 
 import torch
 
-from ..utils.bbox import BoundingBox
-from ..utils.context import EditorAPIContext, ErrorResult, Mode, _get_ctx
+from ..utils.bbox import BoundingBox, is_degenerate, is_outside
+from ..utils.cache import cache_outputs
+from ..utils.context import EditorAPIContext, ErrorResult, Mode, StateID, _get_ctx
 from ..utils.image import image_to_tensor, tensor_to_image
 
 
@@ -17,8 +18,10 @@ class Params:
     rotation_angle: float
     mode: Mode
     seed: int
+    variants: int
 
 
+@cache_outputs
 class Blender:
     @classmethod
     def INPUT_TYPES(cls) -> dict[str, Any]:
@@ -74,6 +77,17 @@ class Blender:
                     },
                 ),
             },
+            "optional": {
+                "variants": (
+                    "INT",
+                    {
+                        "default": 1,
+                        "min": 1,
+                        "max": 16,
+                        "tooltip": "Number of images to generate concurrently, with consecutive seeds.",
+                    },
+                ),
+            },
         }
 
     RETURN_TYPES = ("IMAGE",)
@@ -85,26 +99,12 @@ class Blender:
     FUNCTION = "process"
 
     @staticmethod
-    async def _process(
+    async def _blend(
         ctx: EditorAPIContext,
+        stateid_scene: StateID,
+        stateid_cutout: StateID,
         params: Params,
     ) -> torch.Tensor:
-        assert params.mode in get_args(Mode), f"Mode must be one of {get_args(Mode)}"
-        assert 0 <= params.seed <= 999, "Seed must be an integer between 0 and 999"
-        assert -360 <= params.rotation_angle <= 360, "Rotation angle must be between -360 and 360"
-
-        # convert tensors to PIL images
-        pil_scene = tensor_to_image(params.scene.permute(0, 3, 1, 2))
-        pil_cutout = tensor_to_image(params.cutout.permute(0, 3, 1, 2))
-
-        # make some assertions
-        assert pil_scene.mode == "RGB", "Background must be RGB"
-        assert pil_cutout.mode == "RGBA", "Cutout must be RGBA"
-
-        # upload image and cutout
-        stateid_scene = await ctx.call_async.upload_pil_image(pil_scene)
-        stateid_cutout = await ctx.call_async.upload_pil_image(pil_cutout)
-
         # call blend skill
         result_blend = await ctx.call_async.blend(
             image_state_id=stateid_scene,
@@ -123,9 +123,47 @@ class Blender:
         pil_output = await ctx.call_async.download_pil_image(stateid_blend)
 
         # convert PIL image to tensor
-        tensor_output = image_to_tensor(pil_output).permute(0, 2, 3, 1)
+        return image_to_tensor(pil_output).permute(0, 2, 3, 1)
+
+    @staticmethod
+    async def _upload(
+        ctx: EditorAPIContext,
+        scene: torch.Tensor,
+        cutout: torch.Tensor,
+    ) -> tuple[StateID, StateID]:
+        # convert tensors to PIL images
+        pil_scene = tensor_to_image(scene.permute(0, 3, 1, 2))
+        pil_cutout = tensor_to_image(cutout.permute(0, 3, 1, 2))
+
+        # make some assertions
+        assert pil_scene.mode == "RGB", "Background must be RGB"
+        assert pil_cutout.mode == "RGBA", "Cutout must be RGBA"
+
+        # upload image and cutout
+        stateid_scene = await ctx.call_async.upload_pil_image(pil_scene)
+        stateid_cutout = await ctx.call_async.upload_pil_image(pil_cutout)
+
+        return stateid_scene, stateid_cutout
 
-        return tensor_output
+    @staticmethod
+    async def _process(
+        ctx: EditorAPIContext,
+        params: Params,
+    ) -> torch.Tensor:
+        assert params.mode in get_args(Mode), f"Mode must be one of {get_args(Mode)}"
+        assert 0 <= params.seed <= 999, "Seed must be an integer between 0 and 999"
+        assert -360 <= params.rotation_angle <= 360, "Rotation angle must be between -360 and 360"
+        assert 1 <= params.variants <= 16, "Variants must be an integer between 1 and 16"
+
+        # upload once for all the variants
+        stateid_scene, stateid_cutout = await Blender._upload(ctx, params.scene, params.cutout)
+
+        # generate all the variants concurrently, in a single batch
+        seeds = [(params.seed + i) % 1000 for i in range(params.variants)]
+        outputs = await ctx.gather(
+            *(Blender._blend(ctx, stateid_scene, stateid_cutout, replace(params, seed=seed)) for seed in seeds)
+        )
+        return torch.cat(outputs)
 
     def process(
         self,
@@ -136,7 +174,12 @@ class Blender:
         rotation_angle: float,
         mode: Mode,
         seed: int,
+        variants: int = 1,
     ) -> tuple[torch.Tensor]:
+        # catch invalid bounding boxes before calling the API
+        assert not is_degenerate(bbox), f"Bounding box {bbox} has a zero area"
+        assert not is_outside(bbox, scene.shape[2], scene.shape[1]), f"Bounding box {bbox} is outside the scene"
+
         return (
             _get_ctx().run_one_sync(
                 co=self._process,
@@ -148,6 +191,7 @@ class Blender:
                     bbox=bbox,
                     mode=mode,
                     seed=seed,
+                    variants=variants,
                 ),
             ),
         )
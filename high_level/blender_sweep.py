@@ -0,0 +1,172 @@
+import itertools
+from dataclasses import dataclass
+from typing import Any, Literal, get_args
+
+import torch
+
+from ..utils.bbox import BoundingBox, is_degenerate, is_outside
+from ..utils.cache import cache_outputs
+from ..utils.context import EditorAPIContext, Mode, _get_ctx
+from .blender import Blender
+from .blender import Params as BlendParams
+
+type Flip = Literal["no", "yes", "both"]
+
+FLIPS: dict[Flip, list[bool]] = {
+    "no": [False],
+    "yes": [True],
+    "both": [False, True],
+}
+
+
+@dataclass(kw_only=True)
+class Params:
+    scene: torch.Tensor
+    cutout: torch.Tensor
+    bboxes: list[BoundingBox]
+    flips: list[bool]
+    rotation_angles: list[float]
+    mode: Mode
+    seed: int
+
+
+def parse_angles(angles: str) -> list[float]:
+    return [float(angle) for angle in angles.split(",") if angle.strip()]
+
+
+@cache_outputs
+class BlenderSweep:
+    @classmethod
+    def INPUT_TYPES(cls) -> dict[str, Any]:
+        return {
+            "required": {
+                "scene": (
+                    "IMAGE",
+                    {
+                        "tooltip": "The background scene to blend the cutout into.",
+                    },
+                ),
+                "cutout": (
+                    "IMAGE",
+                    {
+                        "tooltip": "The object cutout to blend into the scene.",
+                    },
+                ),
+                "bbox": (
+                    "BBOX",
+                    {
+                        "tooltip": "Bounding boxes of where to place the cutout in the scene, one or a list of them.",
+                    },
+                ),
+                "mode": (
+                    [
+                        "standard",
+                        "express",
+                    ],
+                ),
+                "flip": (
+                    list(FLIPS),
+                    {
+                        "tooltip": "Flip the cutout horizontally before blending, or try both.",
+                    },
+                ),
+                "rotation_angles": (
+                    "STRING",
+                    {
+                        "default": "0",
+                        "tooltip": "Comma separated angles to rotate the cutout by before blending.",
+                    },
+                ),
+                "seed": (
+                    "INT",
+                    {
+                        "default": 1,
+                        "min": 0,
+                        "max": 999,
+                        "tooltip": "Seed for the random number generator.",
+                    },
+                ),
+            },
+        }
+
+    INPUT_IS_LIST = True
+    RETURN_TYPES = ("IMAGE",)
+    RETURN_NAMES = ("image",)
+
+    TITLE = "Blender Sweep"
+    DESCRIPTION = "Blend an object cutout into a scene, for every combination of placement, flip and rotation."
+    CATEGORY = "Finegrain/high-level"
+    FUNCTION = "process"
+
+    @staticmethod
+    async def _process(
+        ctx: EditorAPIContext,
+        params: Params,
+    ) -> torch.Tensor:
+        assert params.mode in get_args(Mode), f"Mode must be one of {get_args(Mode)}"
+        assert 0 <= params.seed <= 999, "Seed must be an integer between 0 and 999"
+        assert params.rotation_angles, "Rotation angles must not be empty"
+        for angle in params.rotation_angles:
+            assert -360 <= angle <= 360, "Rotation angles must be between -360 and 360"
+
+        # upload once for all the placements
+        stateid_scene, stateid_cutout = await Blender._upload(ctx, params.scene, params.cutout)
+
+        placements = list(itertools.product(params.bboxes, params.flips, params.rotation_angles))
+        output = torch.empty(len(placements), *params.scene.shape[1:3], 3)
+
+        async def blend(index: int, bbox: BoundingBox, flip: bool, rotation_angle: float) -> None:
+            tensor_output = await Blender._blend(
+                ctx,
+                stateid_scene,
+                stateid_cutout,
+                BlendParams(
+                    scene=params.scene,
+                    cutout=params.cutout,
+                    bbox=bbox,
+                    flip=flip,
+                    rotation_angle=rotation_angle,
+                    mode=params.mode,
+                    seed=params.seed,
+                    variants=1,
+                ),
+            )
+            assert tensor_output.shape[1:] == output.shape[1:], "Blended image and scene sizes do not match"
+
+            # write each result into the batch as soon as it is there
+            output[index] = tensor_output[0]
+
+        # dispatch all the placements concurrently
+        await ctx.gather(*(blend(i, *placement) for i, placement in enumerate(placements)))
+
+        return output
+
+    def process(
+        self,
+        scene: list[torch.Tensor],
+        cutout: list[torch.Tensor],
+        bbox: list[BoundingBox],
+        mode: list[Mode],
+        flip: list[Flip],
+        rotation_angles: list[str],
+        seed: list[int],
+    ) -> tuple[torch.Tensor]:
+        # catch invalid bounding boxes before calling the API
+        for b in bbox:
+            assert not is_degenerate(b), f"Bounding box {b} has a zero area"
+            assert not is_outside(b, scene[0].shape[2], scene[0].shape[1]), f"Bounding box {b} is outside the scene"
+
+        return (
+            _get_ctx().run_one_sync(
+                co=self._process,
+                params=Params(
+                    scene=scene[0],
+                    cutout=cutout[0],
+                    bboxes=bbox,
+                    flips=FLIPS[flip[0]],
+                    rotation_angles=parse_angles(rotation_angles[0]),
+                    mode=mode[0],
+                    seed=seed[0],
+                ),
+            ),
+        )
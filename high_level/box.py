@@ -3,31 +3,54 @@ from typing import Any
 
 import torch
 
+from ..utils.bbox import rescale
+from ..utils.cache import cache_outputs
 from ..utils.context import BoundingBox, EditorAPIContext, ErrorResult, _get_ctx
 from ..utils.image import tensor_to_image
 
 
 @dataclass(kw_only=True)
 class Params:
-    image: torch.Tensor
+    image: torch.Tensor | None
+    image_url: str
     prompt: str
+    max_side: int
 
 
+@cache_outputs
 class Box:
     @classmethod
     def INPUT_TYPES(cls) -> dict[str, Any]:
         return {
             "required": {
+                "prompt": (
+                    "STRING",
+                    {
+                        "tooltip": "The product name to detect",
+                    },
+                ),
+            },
+            "optional": {
                 "image": (
                     "IMAGE",
                     {
                         "tooltip": "The image to detect an object in",
                     },
                 ),
-                "prompt": (
+                "image_url": (
                     "STRING",
                     {
-                        "tooltip": "The product name to detect",
+                        "default": "",
+                        "tooltip": "The URL of the image, fetched by the API, instead of uploading the image",
+                    },
+                ),
+                "max_side": (
+                    "INT",
+                    {
+                        "default": 1024,
+                        "min": 0,
+                        "max": 8192,
+                        "tooltip": "Downscale the image to this size before uploading it, 0 to disable",
                     },
                 ),
             },
@@ -48,14 +71,20 @@ class Box:
     ) -> BoundingBox:
         assert params.prompt, "Prompt must not be empty"
 
-        # convert tensors to PIL images
-        pil_image = tensor_to_image(params.image.permute(0, 3, 1, 2))
+        if params.image is None:
+            # let the API fetch the image, the bbox is then in its own coordinates
+            stateid_image = await ctx.call_async.create_state_from_url(params.image_url)
+            sizes = None
+        else:
+            # convert tensors to PIL images
+            pil_image = tensor_to_image(params.image.permute(0, 3, 1, 2))
 
-        # make some assertions
-        assert pil_image.mode == "RGB", "Image must be RGB"
+            # make some assertions
+            assert pil_image.mode == "RGB", "Image must be RGB"
 
-        # upload image
-        stateid_image = await ctx.call_async.upload_pil_image(pil_image)
+            # upload image, downscaled
+            stateid_image, size = await ctx.call_async.upload_downscaled(pil_image, params.max_side)
+            sizes = (size, pil_image.size)
 
         # call bbox skill
         result_bbox = await ctx.call_async.infer_bbox(
@@ -65,20 +94,28 @@ class Box:
         if isinstance(result_bbox, ErrorResult):
             raise ValueError(f"Failed to detect object: {result_bbox.error}")
         bbox = result_bbox.bbox
+        if sizes is not None:
+            bbox = rescale(bbox, src=sizes[0], dst=sizes[1])
 
         return bbox
 
     def process(
         self,
-        image: torch.Tensor,
         prompt: str,
+        image: torch.Tensor | None = None,
+        image_url: str = "",
+        max_side: int = 1024,
     ) -> tuple[BoundingBox]:
+        assert (image is None) != (not image_url), "Exactly one of image and image_url must be given"
+
         return (
             _get_ctx().run_one_sync(
                 co=self._process,
                 params=Params(
                     image=image,
+                    image_url=image_url,
                     prompt=prompt,
+                    max_side=max_side,
                 ),
             ),
         )
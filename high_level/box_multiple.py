@@ -0,0 +1,109 @@
+from dataclasses import dataclass
+from typing import Any
+
+import torch
+
+from ..utils.bbox import rescale
+from ..utils.cache import cache_outputs
+from ..utils.context import BoundingBox, EditorAPIContext, ErrorResult, _get_ctx
+from ..utils.image import tensor_to_image
+
+
+@dataclass(kw_only=True)
+class Params:
+    image: torch.Tensor
+    prompts: list[str]
+    max_side: int
+
+
+def parse_prompts(prompts: str) -> list[str]:
+    return [prompt.strip() for prompt in prompts.splitlines() if prompt.strip()]
+
+
+@cache_outputs
+class BoxMultiple:
+    @classmethod
+    def INPUT_TYPES(cls) -> dict[str, Any]:
+        return {
+            "required": {
+                "image": (
+                    "IMAGE",
+                    {
+                        "tooltip": "The image to detect objects in",
+                    },
+                ),
+                "prompts": (
+                    "STRING",
+                    {
+                        "multiline": True,
+                        "tooltip": "The product names to detect, one per line",
+                    },
+                ),
+            },
+            "optional": {
+                "max_side": (
+                    "INT",
+                    {
+                        "default": 1024,
+                        "min": 0,
+                        "max": 8192,
+                        "tooltip": "Downscale the image to this size before uploading it, 0 to disable",
+                    },
+                ),
+            },
+        }
+
+    RETURN_TYPES = ("BBOX",)
+    RETURN_NAMES = ("bbox",)
+    OUTPUT_IS_LIST = (True,)
+
+    TITLE = "Box Multiple"
+    DESCRIPTION = "Box several objects in an image, one per prompt."
+    CATEGORY = "Finegrain/high-level"
+    FUNCTION = "process"
+
+    @staticmethod
+    async def _process(
+        ctx: EditorAPIContext,
+        params: Params,
+    ) -> list[BoundingBox]:
+        assert params.prompts, "Prompts must not be empty"
+
+        # convert tensors to PIL images
+        pil_image = tensor_to_image(params.image.permute(0, 3, 1, 2))
+
+        # make some assertions
+        assert pil_image.mode == "RGB", "Image must be RGB"
+
+        # upload image, downscaled, once for all the prompts
+        stateid_image, size = await ctx.call_async.upload_downscaled(pil_image, params.max_side)
+
+        async def box(prompt: str) -> BoundingBox:
+            # call bbox skill
+            result_bbox = await ctx.call_async.infer_bbox(
+                state_id=stateid_image,
+                product_name=prompt,
+            )
+            if isinstance(result_bbox, ErrorResult):
+                raise ValueError(f"Failed to detect {prompt}: {result_bbox.error}")
+            return rescale(result_bbox.bbox, src=size, dst=pil_image.size)
+
+        # detect all the objects concurrently
+        return await ctx.gather(*(box(prompt) for prompt in params.prompts))
+
+    def process(
+        self,
+        image: torch.Tensor,
+        prompts: str,
+        max_side: int = 1024,
+    ) -> tuple[list[BoundingBox]]:
+        return (
+            _get_ctx().run_one_sync(
+                co=self._process,
+                params=Params(
+                    image=image,
+                    prompts=parse_prompts(prompts),
+                    max_side=max_side,
+                ),
+            ),
+        )
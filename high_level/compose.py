@@ -0,0 +1,266 @@
+from dataclasses import dataclass
+from typing import Any, Literal, get_args
+
+import torch
+
+from ..utils.bbox import BoundingBox, is_degenerate, is_outside
+from ..utils.cache import cache_outputs
+from ..utils.context import EditorAPIContext, ErrorResult, MergeCutoutsEntry, Mode, StateID, _get_ctx
+from ..utils.image import image_to_tensor, tensor_to_image
+
+type Finish = Literal["none", "blend", "shadow"]
+
+
+@dataclass(kw_only=True)
+class Params:
+    cutouts: list[torch.Tensor]
+    bboxes: list[BoundingBox]
+    flips: list[bool]
+    rotation_angles: list[float]
+    width: int
+    height: int
+    finish: Finish
+    scene: torch.Tensor | None
+    mode: Mode
+    seed: int
+
+
+def broadcast[T](values: list[T], count: int, name: str) -> list[T]:
+    # a single widget value applies to all the cutouts
+    assert len(values) in (1, count), f"There must be a single {name}, or one per cutout"
+    return values * count if len(values) == 1 else values
+
+
+def union_bbox(bboxes: list[BoundingBox], width: int, height: int) -> BoundingBox:
+    # smallest bounding box covering all the others, within the composition
+    return (
+        max(min(b[0] for b in bboxes), 0),
+        max(min(b[1] for b in bboxes), 0),
+        min(max(b[2] for b in bboxes), width),
+        min(max(b[3] for b in bboxes), height),
+    )
+
+
+@cache_outputs
+class ComposeCutouts:
+    @classmethod
+    def INPUT_TYPES(cls) -> dict[str, Any]:
+        return {
+            "required": {
+                "cutout": (
+                    "IMAGE",
+                    {
+                        "tooltip": "The cutouts to compose, as a list or a batch.",
+                    },
+                ),
+                "bbox": (
+                    "BBOX",
+                    {
+                        "tooltip": "Bounding boxes of where to place the cutouts, one per cutout.",
+                    },
+                ),
+                "width": (
+                    "INT",
+                    {
+                        "default": 1024,
+                        "min": 8,
+                        "max": 2048,
+                        "step": 8,
+                        "tooltip": "Width of the composition, ignored when blending into a scene.",
+                    },
+                ),
+                "height": (
+                    "INT",
+                    {
+                        "default": 1024,
+                        "min": 8,
+                        "max": 2048,
+                        "step": 8,
+                        "tooltip": "Height of the composition, ignored when blending into a scene.",
+                    },
+                ),
+                "finish": (
+                    [
+                        "none",
+                        "blend",
+                        "shadow",
+                    ],
+                    {
+                        "tooltip": "Return the composition as is, blend it into the scene, or add a shadow.",
+                    },
+                ),
+                "mode": (
+                    [
+                        "standard",
+                        "express",
+                    ],
+                ),
+                "seed": (
+                    "INT",
+                    {
+                        "default": 1,
+                        "min": 0,
+                        "max": 999,
+                        "tooltip": "Seed for the random number generator.",
+                    },
+                ),
+            },
+            "optional": {
+                "scene": (
+                    "IMAGE",
+                    {
+                        "tooltip": "The background scene to blend the composition into.",
+                    },
+                ),
+                "flip": (
+                    "BOOLEAN",
+                    {
+                        "default": False,
+                        "tooltip": "Flip the cutouts horizontally, one value or one per cutout.",
+                    },
+                ),
+                "rotation_angle": (
+                    "FLOAT",
+                    {
+                        "default": 0.0,
+                        "min": -360.0,
+                        "max": 360.0,
+                        "tooltip": "Rotate the cutouts by the specified angle, one value or one per cutout.",
+                    },
+                ),
+            },
+        }
+
+    INPUT_IS_LIST = True
+    RETURN_TYPES = ("IMAGE",)
+    RETURN_NAMES = ("image",)
+
+    TITLE = "Compose Cutouts"
+    DESCRIPTION = "Compose several object cutouts at once, then optionally blend them into a scene or add a shadow."
+    CATEGORY = "Finegrain/high-level"
+    FUNCTION = "process"
+
+    @staticmethod
+    async def _process(
+        ctx: EditorAPIContext,
+        params: Params,
+    ) -> torch.Tensor:
+        assert params.mode in get_args(Mode), f"Mode must be one of {get_args(Mode)}"
+        assert 0 <= params.seed <= 999, "Seed must be an integer between 0 and 999"
+        assert params.finish != "blend" or params.scene is not None, "Blending requires a scene"
+
+        # convert tensors to PIL images
+        pil_cutouts = [tensor_to_image(cutout.permute(0, 3, 1, 2)) for cutout in params.cutouts]
+        pil_scene = None
+        if params.finish == "blend" and params.scene is not None:
+            pil_scene = tensor_to_image(params.scene.permute(0, 3, 1, 2))
+
+        # make some assertions
+        for pil_cutout in pil_cutouts:
+            assert pil_cutout.mode == "RGBA", "Cutouts must be RGBA"
+        assert pil_scene is None or pil_scene.mode == "RGB", "Background must be RGB"
+
+        # upload all the cutouts, and the scene if needed, concurrently
+        pil_uploads = pil_cutouts + ([] if pil_scene is None else [pil_scene])
+        stateid_uploads = await ctx.gather(*(ctx.call_async.upload_pil_image(i) for i in pil_uploads))
+        stateid_cutouts = stateid_uploads[: len(pil_cutouts)]
+
+        # call merge-cutouts skill
+        resolution = (params.width, params.height) if pil_scene is None else pil_scene.size
+        result_merge = await ctx.call_async.merge_cutouts(
+            resolution=resolution,
+            cutouts=[
+                MergeCutoutsEntry(state_id=state_id, bbox=bbox, flip=flip, rotation_angle=rotation_angle)
+                for state_id, bbox, flip, rotation_angle in zip(
+                    stateid_cutouts, params.bboxes, params.flips, params.rotation_angles, strict=True
+                )
+            ],
+        )
+        if isinstance(result_merge, ErrorResult):
+            raise ValueError(f"Failed to merge cutouts: {result_merge.error}")
+        stateid_output: StateID = result_merge.state_id
+        region = union_bbox(params.bboxes, *resolution)
+
+        if params.finish != "none":
+            # crop the composition to where the cutouts are, and place it back there explicitly,
+            # so that blend and shadow cannot fit it elsewhere whether they go by its canvas or its alpha
+            result_crop = await ctx.call_async.crop(state_id=stateid_output, bbox=region)
+            if isinstance(result_crop, ErrorResult):
+                raise ValueError(f"Failed to crop composition: {result_crop.error}")
+            stateid_output = result_crop.state_id
+
+        if params.finish == "blend":
+            # call blend skill
+            stateid_scene = stateid_uploads[-1]
+            result_blend = await ctx.call_async.blend(
+                image_state_id=stateid_scene,
+                mask_state_id=stateid_output,
+                bbox=region,
+                mode=params.mode,
+                seed=params.seed,
+            )
+            if isinstance(result_blend, ErrorResult):
+                raise ValueError(f"Failed to blend: {result_blend.error}")
+            stateid_output = result_blend.state_id
+
+        elif params.finish == "shadow":
+            # call shadow skill
+            result_shadow = await ctx.call_async.shadow(
+                state_id=stateid_output,
+                resolution=resolution,
+                bbox=region,
+                seed=params.seed,
+                background="transparent",
+            )
+            if isinstance(result_shadow, ErrorResult):
+                raise ValueError(f"Failed to create shadow: {result_shadow.error}")
+            stateid_output = result_shadow.state_id
+
+        # download output image
+        pil_output = await ctx.call_async.download_pil_image(stateid_output)
+
+        # convert PIL image to tensor
+        tensor_output = image_to_tensor(pil_output).permute(0, 2, 3, 1)
+
+        return tensor_output
+
+    def process(
+        self,
+        cutout: list[torch.Tensor],
+        bbox: list[BoundingBox],
+        width: list[int],
+        height: list[int],
+        finish: list[Finish],
+        mode: list[Mode],
+        seed: list[int],
+        scene: list[torch.Tensor] | None = None,
+        flip: list[bool] | None = None,
+        rotation_angle: list[float] | None = None,
+    ) -> tuple[torch.Tensor]:
+        cutouts = [c for batch in cutout for c in batch.split(1)]
+        count = len(cutouts)
+        bboxes = broadcast(bbox, count, "bounding box")
+
+        # catch invalid bounding boxes before calling the API
+        w, h = (scene[0].shape[2], scene[0].shape[1]) if finish[0] == "blend" and scene else (width[0], height[0])
+        for b in bboxes:
+            assert not is_degenerate(b), f"Bounding box {b} has a zero area"
+            assert not is_outside(b, w, h), f"Bounding box {b} is outside the composition"
+
+        return (
+            _get_ctx().run_one_sync(
+                co=self._process,
+                params=Params(
+                    cutouts=cutouts,
+                    bboxes=bboxes,
+                    flips=broadcast(flip or [False], count, "flip"),
+                    rotation_angles=broadcast(rotation_angle or [0.0], count, "rotation angle"),
+                    width=width[0],
+                    height=height[0],
+                    finish=finish[0],
+                    scene=None if scene is None else scene[0],
+                    mode=mode[0],
+                    seed=seed[0],
+                ),
+            ),
+        )
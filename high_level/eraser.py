@@ -3,8 +3,12 @@ from typing import Any, get_args
 
 import torch
 
-from ..utils.context import EditorAPIContext, ErrorResult, Mode, _get_ctx
-from ..utils.image import image_to_tensor, tensor_to_image
+from ..utils.bbox import BoundingBox, crop, expand, mask_bbox, paste
+from ..utils.cache import cache_outputs
+from ..utils.context import EditorAPIContext, ErrorResult, FileTooLarge, Mode, _get_ctx
+from ..utils.image import image_to_tensor, is_empty_mask, tensor_to_image
+from ..utils.mask import mask_to_image, union
+from ..utils.tiling import get_tiling, map_tiles
 
 
 @dataclass(kw_only=True)
@@ -13,8 +17,12 @@ class Params:
     mask: torch.Tensor
     mode: Mode
     seed: int
+    roi: bool
+    roi_margin: int
+    variants: int
 
 
+@cache_outputs
 class Eraser:
     @classmethod
     def INPUT_TYPES(cls) -> dict[str, Any]:
@@ -29,7 +37,7 @@ class Eraser:
                 "mask": (
                     "MASK",
                     {
-                        "tooltip": "The mask of the object to erase",
+                        "tooltip": "The mask of the object to erase, or a batch of masks of the objects to erase",
                     },
                 ),
                 "mode": (
@@ -49,6 +57,33 @@ class Eraser:
                     },
                 ),
             },
+            "optional": {
+                "roi": (
+                    "BOOLEAN",
+                    {
+                        "default": False,
+                        "tooltip": "Only upload the region around the mask, and paste the result back into the image",
+                    },
+                ),
+                "roi_margin": (
+                    "INT",
+                    {
+                        "default": 128,
+                        "min": 0,
+                        "max": 4096,
+                        "tooltip": "Margin around the mask of the uploaded region, in pixels",
+                    },
+                ),
+                "variants": (
+                    "INT",
+                    {
+                        "default": 1,
+                        "min": 1,
+                        "max": 16,
+                        "tooltip": "Number of images to generate concurrently, with consecutive seeds",
+                    },
+                ),
+            },
         }
 
     RETURN_TYPES = ("IMAGE",)
@@ -60,44 +95,88 @@ class Eraser:
     FUNCTION = "process"
 
     @staticmethod
-    async def _process(
+    async def _erase(
         ctx: EditorAPIContext,
+        image: torch.Tensor,
+        mask: torch.Tensor,
         params: Params,
     ) -> torch.Tensor:
-        assert params.mode in get_args(Mode), f"Mode must be one of {get_args(Mode)}"
-        assert 0 <= params.seed <= 999, "Seed must be an integer between 0 and 999"
-
         # convert tensors to PIL images
-        pil_image = tensor_to_image(params.image.permute(0, 3, 1, 2))
-        pil_mask = tensor_to_image(params.mask.unsqueeze(0))
+        pil_image = tensor_to_image(image.permute(0, 3, 1, 2))
+        pil_mask = mask_to_image(mask)
 
         # make some assertions
         assert pil_image.size == pil_mask.size, "Image and mask sizes do not match"
         assert pil_image.mode == "RGB", "Image must be RGB"
-        assert pil_mask.mode == "L", "Mask must be grayscale"
+        assert pil_mask.mode in ("1", "L"), "Mask must be binary or grayscale"
 
-        # upload image and mask
+        # upload image and mask, once for all the variants
         stateid_image = await ctx.call_async.upload_pil_image(pil_image)
         stateid_mask = await ctx.call_async.upload_pil_image(pil_mask)
 
-        # call erase skill
-        result_erase = await ctx.call_async.erase(
-            image_state_id=stateid_image,
-            mask_state_id=stateid_mask,
-            mode=params.mode,
-            seed=params.seed,
-        )
-        if isinstance(result_erase, ErrorResult):
-            raise ValueError(f"Failed to erase object: {result_erase.error}")
-        stateid_erase = result_erase.state_id
+        async def erase(seed: int) -> torch.Tensor:
+            # call erase skill
+            result_erase = await ctx.call_async.erase(
+                image_state_id=stateid_image,
+                mask_state_id=stateid_mask,
+                mode=params.mode,
+                seed=seed,
+            )
+            if isinstance(result_erase, ErrorResult):
+                raise ValueError(f"Failed to erase object: {result_erase.error}")
+            stateid_erase = result_erase.state_id
+
+            # download output image
+            pil_output = await ctx.call_async.download_pil_image(stateid_erase)
+
+            # convert PIL image to tensor
+            return image_to_tensor(pil_output).permute(0, 2, 3, 1)
 
-        # download output image
-        pil_output = await ctx.call_async.download_pil_image(stateid_erase)
+        # generate all the variants concurrently, in a single batch
+        seeds = [(params.seed + i) % 1000 for i in range(params.variants)]
+        return torch.cat(await ctx.gather(*(erase(seed) for seed in seeds)))
 
-        # convert PIL image to tensor
-        tensor_output = image_to_tensor(pil_output).permute(0, 2, 3, 1)
+    @staticmethod
+    async def _process(
+        ctx: EditorAPIContext,
+        params: Params,
+    ) -> torch.Tensor:
+        assert params.mode in get_args(Mode), f"Mode must be one of {get_args(Mode)}"
+        assert 0 <= params.seed <= 999, "Seed must be an integer between 0 and 999"
+        assert 1 <= params.variants <= 16, "Variants must be an integer between 1 and 16"
 
-        return tensor_output
+        image, mask = params.image, params.mask
+        width, height = image.shape[2], image.shape[1]
+        bbox = mask_bbox(mask)
+
+        # the regions left untouched are the same for all the variants
+        base = image.expand(params.variants, -1, -1, -1)
+
+        try:
+            # only keep the region around the mask if needed
+            if params.roi and bbox is not None:
+                roi = expand(bbox, params.roi_margin, width, height)
+                tensor_output = await Eraser._erase(ctx, crop(image, roi), crop(mask, roi), params)
+
+                # paste the region back into the full image
+                return paste(base, tensor_output, roi)
+
+            return await Eraser._erase(ctx, image, mask, params)
+        except FileTooLarge:
+            if bbox is None:
+                raise
+
+        # the API refused the image, erase it tile by tile, only where the mask is
+        _, overlap = get_tiling()
+        region = expand(bbox, max(params.roi_margin if params.roi else 0, overlap), width, height)
+
+        async def erase_tile(tile: BoundingBox) -> torch.Tensor | None:
+            tile_mask = crop(mask, tile)
+            if is_empty_mask(tile_mask):
+                return None
+            return await Eraser._erase(ctx, crop(image, tile), tile_mask, params)
+
+        return await map_tiles(ctx, base, region, erase_tile)
 
     def process(
         self,
@@ -105,7 +184,17 @@ class Eraser:
         mask: torch.Tensor,
         mode: Mode,
         seed: int,
+        roi: bool = False,
+        roi_margin: int = 128,
+        variants: int = 1,
     ) -> tuple[torch.Tensor]:
+        # erase all the objects at once
+        mask = union(mask)
+
+        # nothing to erase, skip the API altogether
+        if is_empty_mask(mask):
+            return (image.repeat(variants, 1, 1, 1),)
+
         return (
             _get_ctx().run_one_sync(
                 co=self._process,
@@ -114,6 +203,9 @@ class Eraser:
                     mask=mask,
                     mode=mode,
                     seed=seed,
+                    roi=roi,
+                    roi_margin=roi_margin,
+                    variants=variants,
                 ),
             ),
         )
@@ -3,26 +3,46 @@ from typing import Any
 
 import torch
 
+from ..utils.cache import cache_outputs
 from ..utils.context import EditorAPIContext, ErrorResult, _get_ctx
 from ..utils.image import tensor_to_image
 
 
 @dataclass(kw_only=True)
 class Params:
-    image: torch.Tensor
+    image: torch.Tensor | None
+    image_url: str
+    max_side: int
 
 
+@cache_outputs
 class InferMainSubject:
     @classmethod
     def INPUT_TYPES(cls) -> dict[str, Any]:
         return {
-            "required": {
+            "optional": {
                 "image": (
                     "IMAGE",
                     {
                         "tooltip": "The image to guess the main subject of.",
                     },
                 ),
+                "image_url": (
+                    "STRING",
+                    {
+                        "default": "",
+                        "tooltip": "The URL of the image, fetched by the API, instead of uploading the image",
+                    },
+                ),
+                "max_side": (
+                    "INT",
+                    {
+                        "default": 1024,
+                        "min": 0,
+                        "max": 8192,
+                        "tooltip": "Downscale the image to this size before uploading it, 0 to disable",
+                    },
+                ),
             },
         }
 
@@ -39,14 +59,18 @@ class InferMainSubject:
         ctx: EditorAPIContext,
         params: Params,
     ) -> str:
-        # convert tensors to PIL images
-        pil_image = tensor_to_image(params.image.permute(0, 3, 1, 2))
+        if params.image is None:
+            # let the API fetch the image
+            stateid_image = await ctx.call_async.create_state_from_url(params.image_url)
+        else:
+            # convert tensors to PIL images
+            pil_image = tensor_to_image(params.image.permute(0, 3, 1, 2))
 
-        # make some assertions
-        assert pil_image.mode == "RGB", "Image must be RGB"
+            # make some assertions
+            assert pil_image.mode == "RGB", "Image must be RGB"
 
-        # upload image
-        stateid_image = await ctx.call_async.upload_pil_image(pil_image)
+            # upload image, downscaled
+            stateid_image, _ = await ctx.call_async.upload_downscaled(pil_image, params.max_side)
 
         # call infer-main-subject skill
         result_subject = await ctx.call_async.infer_main_subject(state_id=stateid_image)
@@ -58,13 +82,19 @@ class InferMainSubject:
 
     def process(
         self,
-        image: torch.Tensor,
+        image: torch.Tensor | None = None,
+        image_url: str = "",
+        max_side: int = 1024,
     ) -> tuple[str]:
+        assert (image is None) != (not image_url), "Exactly one of image and image_url must be given"
+
         return (
             _get_ctx().run_one_sync(
                 co=self._process,
                 params=Params(
                     image=image,
+                    image_url=image_url,
+                    max_side=max_side,
                 ),
             ),
         )
@@ -3,8 +3,12 @@ from typing import Any
 
 import torch
 
-from ..utils.context import EditorAPIContext, ErrorResult, _get_ctx
-from ..utils.image import image_to_tensor, tensor_to_image
+from ..utils.bbox import BoundingBox, crop, expand, mask_bbox, paste
+from ..utils.cache import cache_outputs
+from ..utils.context import EditorAPIContext, ErrorResult, FileTooLarge, _get_ctx
+from ..utils.image import image_to_tensor, is_empty_mask, tensor_to_image
+from ..utils.mask import mask_to_image
+from ..utils.tiling import get_tiling, map_tiles
 
 
 @dataclass(kw_only=True)
@@ -12,8 +16,11 @@ class Params:
     image: torch.Tensor
     mask: torch.Tensor
     color: str
+    roi: bool
+    roi_margin: int
 
 
+@cache_outputs
 class Recolor:
     @classmethod
     def INPUT_TYPES(cls) -> dict[str, Any]:
@@ -39,6 +46,24 @@ class Recolor:
                     },
                 ),
             },
+            "optional": {
+                "roi": (
+                    "BOOLEAN",
+                    {
+                        "default": False,
+                        "tooltip": "Only upload the region around the mask, and paste the result back into the image",
+                    },
+                ),
+                "roi_margin": (
+                    "INT",
+                    {
+                        "default": 128,
+                        "min": 0,
+                        "max": 4096,
+                        "tooltip": "Margin around the mask of the uploaded region, in pixels",
+                    },
+                ),
+            },
         }
 
     RETURN_TYPES = ("IMAGE",)
@@ -50,18 +75,20 @@ class Recolor:
     FUNCTION = "process"
 
     @staticmethod
-    async def _process(
+    async def _recolor(
         ctx: EditorAPIContext,
+        image: torch.Tensor,
+        mask: torch.Tensor,
         params: Params,
     ) -> torch.Tensor:
         # convert tensors to PIL images
-        pil_image = tensor_to_image(params.image.permute(0, 3, 1, 2))
-        pil_mask = tensor_to_image(params.mask.unsqueeze(0))
+        pil_image = tensor_to_image(image.permute(0, 3, 1, 2))
+        pil_mask = mask_to_image(mask)
 
         # make some assertions
         assert pil_image.size == pil_mask.size, "Image and mask sizes do not match"
         assert pil_image.mode == "RGB", "Image must be RGB"
-        assert pil_mask.mode == "L", "Mask must be grayscale"
+        assert pil_mask.mode in ("1", "L"), "Mask must be binary or grayscale"
 
         # upload image and mask
         stateid_image = await ctx.call_async.upload_pil_image(pil_image)
@@ -81,16 +108,55 @@ class Recolor:
         pil_output = await ctx.call_async.download_pil_image(stateid_recolor)
 
         # convert PIL image to tensor
-        tensor_output = image_to_tensor(pil_output).permute(0, 2, 3, 1)
+        return image_to_tensor(pil_output).permute(0, 2, 3, 1)
+
+    @staticmethod
+    async def _process(
+        ctx: EditorAPIContext,
+        params: Params,
+    ) -> torch.Tensor:
+        image, mask = params.image, params.mask
+        width, height = image.shape[2], image.shape[1]
+        bbox = mask_bbox(mask)
+
+        try:
+            # only keep the region around the mask if needed
+            if params.roi and bbox is not None:
+                roi = expand(bbox, params.roi_margin, width, height)
+                tensor_output = await Recolor._recolor(ctx, crop(image, roi), crop(mask, roi), params)
 
-        return tensor_output
+                # paste the region back into the full image
+                return paste(image, tensor_output, roi)
+
+            return await Recolor._recolor(ctx, image, mask, params)
+        except FileTooLarge:
+            if bbox is None:
+                raise
+
+        # the API refused the image, recolor it tile by tile, only where the mask is
+        _, overlap = get_tiling()
+        region = expand(bbox, max(params.roi_margin if params.roi else 0, overlap), width, height)
+
+        async def recolor_tile(tile: BoundingBox) -> torch.Tensor | None:
+            tile_mask = crop(mask, tile)
+            if is_empty_mask(tile_mask):
+                return None
+            return await Recolor._recolor(ctx, crop(image, tile), tile_mask, params)
+
+        return await map_tiles(ctx, image, region, recolor_tile)
 
     def process(
         self,
         image: torch.Tensor,
         mask: torch.Tensor,
         color: str,
+        roi: bool = False,
+        roi_margin: int = 128,
     ) -> tuple[torch.Tensor]:
+        # nothing to recolor, skip the API altogether
+        if is_empty_mask(mask):
+            return (image,)
+
         return (
             _get_ctx().run_one_sync(
                 co=self._process,
@@ -98,6 +164,8 @@ class Recolor:
                     image=image,
                     mask=mask,
                     color=color,
+                    roi=roi,
+                    roi_margin=roi_margin,
                 ),
             ),
         )
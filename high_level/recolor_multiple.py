@@ -0,0 +1,138 @@
+from dataclasses import dataclass
+from typing import Any
+
+import torch
+
+from ..utils.cache import cache_outputs
+from ..utils.context import EditorAPIContext, ErrorResult, _get_ctx
+from ..utils.image import image_to_tensor, is_empty_mask, tensor_to_image
+from ..utils.mask import mask_to_image, union
+
+
+@dataclass(kw_only=True)
+class Params:
+    image: torch.Tensor
+    masks: list[torch.Tensor]
+    colors: list[str]
+
+
+def parse_colors(colors: str) -> list[str]:
+    # one color per line, as colors may contain commas, e.g. rgb(255, 0, 0)
+    return [color.strip() for color in colors.splitlines() if color.strip()]
+
+
+def group_masks(mask: torch.Tensor, colors: list[str]) -> tuple[list[torch.Tensor], list[str]]:
+    # pair masks with their color, dropping empty masks and merging consecutive masks of the same color
+    assert len(colors) in (1, mask.shape[0]), "There must be a single color, or one color per mask"
+    if len(colors) == 1:
+        colors = colors * mask.shape[0]
+
+    masks: list[torch.Tensor] = []
+    groups: list[str] = []
+    for m, color in zip(mask.split(1), colors, strict=True):
+        if is_empty_mask(m):
+            continue
+        if groups and groups[-1] == color:
+            masks[-1] = union(torch.cat((masks[-1], m)))
+        else:
+            masks.append(m)
+            groups.append(color)
+    return masks, groups
+
+
+@cache_outputs
+class RecolorMultiple:
+    @classmethod
+    def INPUT_TYPES(cls) -> dict[str, Any]:
+        return {
+            "required": {
+                "image": (
+                    "IMAGE",
+                    {
+                        "tooltip": "The image to recolor objects in",
+                    },
+                ),
+                "mask": (
+                    "MASK",
+                    {
+                        "tooltip": "A batch of masks, one per object to recolor",
+                    },
+                ),
+                "colors": (
+                    "STRING",
+                    {
+                        "default": "#ff0000",
+                        "multiline": True,
+                        "tooltip": "The colors to recolor the objects to, one per line and per mask, or one for all",
+                    },
+                ),
+            },
+        }
+
+    RETURN_TYPES = ("IMAGE",)
+    RETURN_NAMES = ("image",)
+
+    TITLE = "Recolor Multiple"
+    DESCRIPTION = "Recolor several masked objects in an image, each in its own color."
+    CATEGORY = "Finegrain/high-level"
+    FUNCTION = "process"
+
+    @staticmethod
+    async def _process(
+        ctx: EditorAPIContext,
+        params: Params,
+    ) -> torch.Tensor:
+        # convert tensors to PIL images
+        pil_image = tensor_to_image(params.image.permute(0, 3, 1, 2))
+        pil_masks = [mask_to_image(mask) for mask in params.masks]
+
+        # make some assertions
+        assert pil_image.mode == "RGB", "Image must be RGB"
+        for pil_mask in pil_masks:
+            assert pil_image.size == pil_mask.size, "Image and mask sizes do not match"
+
+        # upload image once, and the masks concurrently
+        stateid_image = await ctx.call_async.upload_pil_image(pil_image)
+        stateid_masks = await ctx.gather(*(ctx.call_async.upload_pil_image(pil_mask) for pil_mask in pil_masks))
+
+        # chain the recolor skill calls on the server
+        for stateid_mask, color in zip(stateid_masks, params.colors, strict=True):
+            result_recolor = await ctx.call_async.recolor(
+                image_state_id=stateid_image,
+                mask_state_id=stateid_mask,
+                color=color,
+            )
+            if isinstance(result_recolor, ErrorResult):
+                raise ValueError(f"Failed to recolor object: {result_recolor.error}")
+            stateid_image = result_recolor.state_id
+
+        # download the final image only
+        pil_output = await ctx.call_async.download_pil_image(stateid_image)
+
+        # convert PIL image to tensor
+        tensor_output = image_to_tensor(pil_output).permute(0, 2, 3, 1)
+
+        return tensor_output
+
+    def process(
+        self,
+        image: torch.Tensor,
+        mask: torch.Tensor,
+        colors: str,
+    ) -> tuple[torch.Tensor]:
+        masks, groups = group_masks(mask, parse_colors(colors))
+
+        # nothing to recolor, skip the API altogether
+        if not masks:
+            return (image,)
+
+        return (
+            _get_ctx().run_one_sync(
+                co=self._process,
+                params=Params(
+                    image=image,
+                    masks=masks,
+                    colors=groups,
+                ),
+            ),
+        )
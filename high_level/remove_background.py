@@ -0,0 +1,122 @@
+import io
+from dataclasses import dataclass
+from typing import Any
+
+import torch
+from PIL import Image
+
+from ..utils.bbox import BoundingBox
+from ..utils.cache import cache_outputs
+from ..utils.context import CutoutResultWithImage, EditorAPIContext, ErrorResult, ImageOutParams, _get_ctx
+from ..utils.image import image_to_tensor, tensor_to_image
+
+
+@dataclass(kw_only=True)
+class Params:
+    image: torch.Tensor
+    subject: str
+
+
+@cache_outputs
+class RemoveBackground:
+    @classmethod
+    def INPUT_TYPES(cls) -> dict[str, Any]:
+        return {
+            "required": {
+                "image": (
+                    "IMAGE",
+                    {
+                        "tooltip": "The image to remove the background from",
+                    },
+                ),
+            },
+            "optional": {
+                "subject": (
+                    "STRING",
+                    {
+                        "default": "",
+                        "tooltip": "The product name to cut out, inferred from the image if empty",
+                    },
+                ),
+            },
+        }
+
+    RETURN_TYPES = ("IMAGE", "STRING", "BBOX")
+    RETURN_NAMES = ("cutout", "subject", "bbox")
+
+    TITLE = "Remove Background"
+    DESCRIPTION = "Cut out the main subject of an image, in a single upload and download."
+    CATEGORY = "Finegrain/high-level"
+    FUNCTION = "process"
+
+    @staticmethod
+    async def _process(
+        ctx: EditorAPIContext,
+        params: Params,
+    ) -> tuple[torch.Tensor, str, BoundingBox]:
+        # convert tensors to PIL images
+        pil_image = tensor_to_image(params.image.permute(0, 3, 1, 2))
+
+        # make some assertions
+        assert pil_image.mode == "RGB", "Image must be RGB"
+
+        # upload image, every step below works on state ids
+        stateid_image = await ctx.call_async.upload_pil_image(pil_image)
+
+        # call infer-main-subject skill, unless the subject is given
+        subject = params.subject
+        if not subject:
+            result_subject = await ctx.call_async.infer_main_subject(state_id=stateid_image)
+            if isinstance(result_subject, ErrorResult):
+                raise ValueError(f"Failed to infer main subject: {result_subject.error}")
+            subject = result_subject.main_subject
+
+        # call bbox skill
+        result_bbox = await ctx.call_async.infer_bbox(
+            state_id=stateid_image,
+            product_name=subject,
+        )
+        if isinstance(result_bbox, ErrorResult):
+            raise ValueError(f"Failed to detect object: {result_bbox.error}")
+        bbox = result_bbox.bbox
+
+        # call segment skill
+        result_segment = await ctx.call_async.segment(
+            state_id=stateid_image,
+            bbox=bbox,
+        )
+        if isinstance(result_segment, ErrorResult):
+            raise ValueError(f"Failed to segment object: {result_segment.error}")
+        stateid_mask = result_segment.state_id
+
+        # call cutout skill, fetching the resulting image along with its metadata
+        result_cutout = await ctx.call_async.cutout(
+            image_state_id=stateid_image,
+            mask_state_id=stateid_mask,
+            with_image=ImageOutParams(image_format="PNG", resolution="FULL"),
+        )
+        if isinstance(result_cutout, ErrorResult):
+            raise ValueError(f"Failed to cut out object: {result_cutout.error}")
+        assert isinstance(result_cutout, CutoutResultWithImage)
+
+        # the lossless full resolution image holds the exact pixels of the state
+        pil_output = Image.open(io.BytesIO(result_cutout.image))
+        ctx.provenance.record(pil_output, result_cutout.state_id)
+
+        # convert PIL image to tensor
+        tensor_output = image_to_tensor(pil_output).permute(0, 2, 3, 1)
+
+        return tensor_output, subject, bbox
+
+    def process(
+        self,
+        image: torch.Tensor,
+        subject: str = "",
+    ) -> tuple[torch.Tensor, str, BoundingBox]:
+        return _get_ctx().run_one_sync(
+            co=self._process,
+            params=Params(
+                image=image,
+                subject=subject.strip(),
+            ),
+        )
@@ -3,29 +3,28 @@ from typing import Any
 
 import torch
 
-from ..utils.bbox import BoundingBox
-from ..utils.context import EditorAPIContext, ErrorResult, _get_ctx
-from ..utils.image import image_to_tensor, tensor_to_image
+from ..utils.bbox import BoundingBox, crop, expand, is_degenerate, is_outside, paste
+from ..utils.cache import cache_outputs
+from ..utils.context import EditorAPIContext, ErrorResult, FileTooLarge, StateID, _get_ctx
+from ..utils.image import tensor_to_image
+from ..utils.mask import expand_mask, image_to_mask
+from ..utils.tiling import get_tiling, intersect, map_tiles, translate
 
 
 @dataclass(kw_only=True)
 class Params:
-    image: torch.Tensor
+    image: torch.Tensor | None
+    image_url: str
     bbox: BoundingBox
     cropped: bool
 
 
+@cache_outputs
 class Segment:
     @classmethod
     def INPUT_TYPES(cls) -> dict[str, Any]:
         return {
             "required": {
-                "image": (
-                    "IMAGE",
-                    {
-                        "tooltip": "The image to segment",
-                    },
-                ),
                 "bbox": (
                     "BBOX",
                     {
@@ -40,6 +39,21 @@ class Segment:
                     },
                 ),
             },
+            "optional": {
+                "image": (
+                    "IMAGE",
+                    {
+                        "tooltip": "The image to segment",
+                    },
+                ),
+                "image_url": (
+                    "STRING",
+                    {
+                        "default": "",
+                        "tooltip": "The URL of the image, fetched by the API, instead of uploading the image",
+                    },
+                ),
+            },
         }
 
     RETURN_TYPES = ("MASK",)
@@ -51,12 +65,13 @@ class Segment:
     FUNCTION = "process"
 
     @staticmethod
-    async def _process(
+    async def _segment(
         ctx: EditorAPIContext,
-        params: Params,
+        image: torch.Tensor,
+        bbox: BoundingBox,
     ) -> torch.Tensor:
         # convert tensors to PIL images
-        pil_image = tensor_to_image(params.image.permute(0, 3, 1, 2))
+        pil_image = tensor_to_image(image.permute(0, 3, 1, 2))
 
         # make some assertions
         assert pil_image.mode == "RGB", "Image must be RGB"
@@ -64,46 +79,102 @@ class Segment:
         # upload image
         stateid_image = await ctx.call_async.upload_pil_image(pil_image)
 
+        return await Segment._segment_state(ctx, stateid_image, bbox)
+
+    @staticmethod
+    async def _segment_state(
+        ctx: EditorAPIContext,
+        stateid_image: StateID,
+        bbox: BoundingBox,
+    ) -> torch.Tensor:
         # call segment skill
         result_segment = await ctx.call_async.segment(
             state_id=stateid_image,
-            bbox=params.bbox,
+            bbox=bbox,
         )
         if isinstance(result_segment, ErrorResult):
             raise ValueError(f"Failed to segment object: {result_segment.error}")
         stateid_mask = result_segment.state_id
 
-        # call crop if needed
-        if params.cropped:
-            result_crop = await ctx.call_async.crop(
-                state_id=stateid_mask,
-                bbox=params.bbox,
-            )
-            if isinstance(result_crop, ErrorResult):
-                raise ValueError(f"Failed to crop mask: {result_crop.error}")
-            stateid_mask = result_crop.state_id
-
         # download mask
         pil_output = await ctx.call_async.download_pil_image(stateid_mask)
 
-        # convert PIL image to tensor
-        tensor_output = image_to_tensor(pil_output).squeeze(0)
+        # decode to a compact mask
+        return image_to_mask(pil_output)
+
+    @staticmethod
+    async def _segment_region(
+        ctx: EditorAPIContext,
+        image: torch.Tensor,
+        bbox: BoundingBox,
+    ) -> torch.Tensor:
+        # the API refused the image, only segment the region around the bounding box
+        width, height = image.shape[2], image.shape[1]
+        tile_size, overlap = get_tiling()
+        region = expand(bbox, overlap, width, height)
+        empty = torch.zeros(1, height, width, dtype=torch.uint8)
+
+        if max(region[2] - region[0], region[3] - region[1]) <= tile_size:
+            tensor_output = await Segment._segment(ctx, crop(image, region), translate(bbox, -region[0], -region[1]))
+            return paste(empty, tensor_output, region)
+
+        # objects larger than a tile are segmented tile by tile, each tile only seeing part of them
+        async def segment_tile(tile: BoundingBox) -> torch.Tensor | None:
+            tile_bbox = intersect(bbox, tile)
+            if tile_bbox is None:
+                return None
+            return await Segment._segment(ctx, crop(image, tile), translate(tile_bbox, -tile[0], -tile[1]))
+
+        return await map_tiles(ctx, empty, region, segment_tile)
+
+    @staticmethod
+    async def _process(
+        ctx: EditorAPIContext,
+        params: Params,
+    ) -> torch.Tensor:
+        image, bbox = params.image, params.bbox
+
+        if image is None:
+            # let the API fetch the image
+            stateid_image = await ctx.call_async.create_state_from_url(params.image_url)
+            tensor_output = await Segment._segment_state(ctx, stateid_image, bbox)
+
+        else:
+            try:
+                tensor_output = await Segment._segment(ctx, image, bbox)
+            except FileTooLarge:
+                tensor_output = await Segment._segment_region(ctx, image, bbox)
+
+        # crop locally if needed, the bbox is already known
+        if params.cropped:
+            tensor_output = crop(tensor_output, bbox)
 
         return tensor_output
 
     def process(
         self,
-        image: torch.Tensor,
         bbox: BoundingBox,
         cropped: bool = False,
+        image: torch.Tensor | None = None,
+        image_url: str = "",
     ) -> tuple[torch.Tensor]:
+        assert (image is None) != (not image_url), "Exactly one of image and image_url must be given"
+
+        # catch invalid bounding boxes before calling the API
+        assert not is_degenerate(bbox), f"Bounding box {bbox} has a zero area"
+        if image is not None:
+            assert not is_outside(bbox, image.shape[2], image.shape[1]), f"Bounding box {bbox} is outside the image"
+
         return (
-            _get_ctx().run_one_sync(
-                co=self._process,
-                params=Params(
-                    image=image,
-                    bbox=bbox,
-                    cropped=cropped,
+            expand_mask(
+                _get_ctx().run_one_sync(
+                    co=self._process,
+                    params=Params(
+                        image=image,
+                        image_url=image_url,
+                        bbox=bbox,
+                        cropped=cropped,
+                    ),
                 ),
             ),
         )
@@ -0,0 +1,95 @@
+from dataclasses import dataclass
+from typing import Any
+
+import torch
+
+from ..utils.bbox import BoundingBox, is_degenerate, is_outside
+from ..utils.cache import cache_outputs
+from ..utils.context import EditorAPIContext, FileTooLarge, _get_ctx
+from ..utils.image import tensor_to_image
+from ..utils.mask import expand_mask
+from .segment import Segment
+
+
+@dataclass(kw_only=True)
+class Params:
+    image: torch.Tensor
+    bboxes: list[BoundingBox]
+
+
+@cache_outputs
+class SegmentMultiple:
+    @classmethod
+    def INPUT_TYPES(cls) -> dict[str, Any]:
+        return {
+            "required": {
+                "image": (
+                    "IMAGE",
+                    {
+                        "tooltip": "The image to segment",
+                    },
+                ),
+                "bbox": (
+                    "BBOX",
+                    {
+                        "tooltip": "Bounding boxes of the objects to segment, as a list",
+                    },
+                ),
+            },
+        }
+
+    INPUT_IS_LIST = True
+    RETURN_TYPES = ("MASK",)
+    RETURN_NAMES = ("mask",)
+
+    TITLE = "Segment Multiple"
+    DESCRIPTION = "Segment several objects in an image, one per bounding box."
+    CATEGORY = "Finegrain/high-level"
+    FUNCTION = "process"
+
+    @staticmethod
+    async def _process(
+        ctx: EditorAPIContext,
+        params: Params,
+    ) -> torch.Tensor:
+        # convert tensors to PIL images
+        pil_image = tensor_to_image(params.image.permute(0, 3, 1, 2))
+
+        # make some assertions
+        assert pil_image.mode == "RGB", "Image must be RGB"
+
+        try:
+            # upload image, once for all the bounding boxes
+            stateid_image = await ctx.call_async.upload_pil_image(pil_image)
+        except FileTooLarge:
+            # the API refused the image, segment around each bounding box instead
+            masks = await ctx.gather(*(Segment._segment_region(ctx, params.image, bbox) for bbox in params.bboxes))
+            return torch.cat(masks)
+
+        # segment all the objects concurrently, into a batch of compact masks
+        masks = await ctx.gather(*(Segment._segment_state(ctx, stateid_image, bbox) for bbox in params.bboxes))
+        return torch.cat(masks)
+
+    def process(
+        self,
+        image: list[torch.Tensor],
+        bbox: list[BoundingBox],
+    ) -> tuple[torch.Tensor]:
+        assert bbox, "Bounding boxes must not be empty"
+
+        # catch invalid bounding boxes before calling the API
+        for b in bbox:
+            assert not is_degenerate(b), f"Bounding box {b} has a zero area"
+            assert not is_outside(b, image[0].shape[2], image[0].shape[1]), f"Bounding box {b} is outside the image"
+
+        return (
+            expand_mask(
+                _get_ctx().run_one_sync(
+                    co=self._process,
+                    params=Params(
+                        image=image[0],
+                        bboxes=bbox,
+                    ),
+                ),
+            ),
+        )
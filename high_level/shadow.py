@@ -4,8 +4,9 @@ from typing import Any
 import torch
 
 from ..utils.bbox import BoundingBox
+from ..utils.cache import cache_outputs
 from ..utils.context import EditorAPIContext, ErrorResult, _get_ctx
-from ..utils.image import image_to_tensor, tensor_to_image
+from ..utils.image import composite_background, image_to_tensor, parse_color, tensor_to_image
 
 
 @dataclass(kw_only=True)
@@ -16,8 +17,10 @@ class Params:
     seed: int
     bgcolor: str
     bbox: BoundingBox | None
+    variants: int
 
 
+@cache_outputs
 class Shadow:
     @classmethod
     def INPUT_TYPES(cls) -> dict[str, Any]:
@@ -73,6 +76,15 @@ class Shadow:
                         "tooltip": "Bounding box of where to place the object in the output image.",
                     },
                 ),
+                "variants": (
+                    "INT",
+                    {
+                        "default": 1,
+                        "min": 1,
+                        "max": 16,
+                        "tooltip": "Number of images to generate concurrently, with consecutive seeds.",
+                    },
+                ),
             },
         }
 
@@ -92,6 +104,7 @@ class Shadow:
         assert 0 <= params.seed <= 999, "Seed must be an integer between 0 and 999"
         assert params.width >= 8, "Width must be at least 8"
         assert params.height >= 8, "Height must be at least 8"
+        assert 1 <= params.variants <= 16, "Variants must be an integer between 1 and 16"
 
         # convert tensors to PIL images
         pil_cutout = tensor_to_image(params.cutout.permute(0, 3, 1, 2))
@@ -99,36 +112,48 @@ class Shadow:
         # make some assertions
         assert pil_cutout.mode == "RGBA", "Cutout must be RGBA"
 
-        # upload cutout
+        # upload cutout, once for all the variants
         stateid_cutout = await ctx.call_async.upload_pil_image(pil_cutout)
 
-        # call shadow skill
-        result_shadow = await ctx.call_async.shadow(
-            state_id=stateid_cutout,
-            resolution=(params.width, params.height),
-            bbox=params.bbox,
-            seed=params.seed,
-            background="transparent",
-        )
-        if isinstance(result_shadow, ErrorResult):
-            raise ValueError(f"Failed to create shadow: {result_shadow.error}")
-        stateid_shadow = result_shadow.state_id
-
-        if params.bgcolor != "transparent":
-            # call set_background_color skill
-            result_bgcolor = await ctx.call_async.set_background_color(
-                state_id=stateid_shadow,
-                background=params.bgcolor,
+        # opaque colors are composited locally, others are left to the API
+        bgcolor = None if params.bgcolor == "transparent" else parse_color(params.bgcolor)
+
+        async def shadow(seed: int) -> torch.Tensor:
+            # call shadow skill
+            result_shadow = await ctx.call_async.shadow(
+                state_id=stateid_cutout,
+                resolution=(params.width, params.height),
+                bbox=params.bbox,
+                seed=seed,
+                background="transparent",
             )
-            if isinstance(result_bgcolor, ErrorResult):
-                raise ValueError(f"Failed to set background color: {result_bgcolor.error}")
-            stateid_shadow = result_bgcolor.state_id
-
-        # download output image
-        pil_output = await ctx.call_async.download_pil_image(stateid_shadow)
-
-        # convert PIL image to tensor
-        tensor_output = image_to_tensor(pil_output).permute(0, 2, 3, 1)
+            if isinstance(result_shadow, ErrorResult):
+                raise ValueError(f"Failed to create shadow: {result_shadow.error}")
+            stateid_shadow = result_shadow.state_id
+
+            if params.bgcolor != "transparent" and bgcolor is None:
+                # call set_background_color skill
+                result_bgcolor = await ctx.call_async.set_background_color(
+                    state_id=stateid_shadow,
+                    background=params.bgcolor,
+                )
+                if isinstance(result_bgcolor, ErrorResult):
+                    raise ValueError(f"Failed to set background color: {result_bgcolor.error}")
+                stateid_shadow = result_bgcolor.state_id
+
+            # download output image
+            pil_output = await ctx.call_async.download_pil_image(stateid_shadow)
+
+            # convert PIL image to tensor
+            return image_to_tensor(pil_output).permute(0, 2, 3, 1)
+
+        # generate all the variants concurrently, in a single batch
+        seeds = [(params.seed + i) % 1000 for i in range(params.variants)]
+        tensor_output = torch.cat(await ctx.gather(*(shadow(seed) for seed in seeds)))
+
+        # set the background color
+        if bgcolor is not None:
+            tensor_output = composite_background(tensor_output, bgcolor)
 
         return tensor_output
 
@@ -140,6 +165,7 @@ class Shadow:
         seed: int,
         bgcolor: str,
         bbox: BoundingBox | None = None,
+        variants: int = 1,
     ) -> tuple[torch.Tensor]:
         return (
             _get_ctx().run_one_sync(
@@ -151,6 +177,7 @@ class Shadow:
                     seed=seed,
                     bgcolor=bgcolor,
                     bbox=bbox,
+                    variants=variants,
                 ),
             ),
         )
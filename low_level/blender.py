@@ -2,6 +2,7 @@ from dataclasses import dataclass
 from typing import Any, get_args
 
 from ..utils.bbox import BoundingBox
+from ..utils.cache import cache_outputs
 from ..utils.context import EditorAPIContext, ErrorResult, Mode, StateID, _get_ctx
 
 
@@ -16,6 +17,7 @@ class Params:
     seed: int
 
 
+@cache_outputs
 class Blender:
     @classmethod
     def INPUT_TYPES(cls) -> dict[str, Any]:
@@ -2,6 +2,7 @@ from dataclasses import dataclass
 from typing import Any
 
 from ..utils.bbox import BoundingBox
+from ..utils.cache import cache_outputs
 from ..utils.context import EditorAPIContext, ErrorResult, StateID, _get_ctx
 
 
@@ -11,6 +12,7 @@ class Params:
     prompt: str
 
 
+@cache_outputs
 class Box:
     @classmethod
     def INPUT_TYPES(cls) -> dict[str, Any]:
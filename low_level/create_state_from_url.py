@@ -0,0 +1,58 @@
+from dataclasses import dataclass
+from typing import Any
+
+from ..utils.cache import cache_outputs
+from ..utils.context import EditorAPIContext, StateID, _get_ctx
+
+
+@dataclass(kw_only=True)
+class Params:
+    url: str
+
+
+@cache_outputs
+class CreateStateFromURL:
+    @classmethod
+    def INPUT_TYPES(cls) -> dict[str, Any]:
+        return {
+            "required": {
+                "url": (
+                    "STRING",
+                    {
+                        "tooltip": "The URL of the image, fetched by the API",
+                    },
+                ),
+            },
+        }
+
+    RETURN_TYPES = ("STATEID",)
+    RETURN_NAMES = ("image",)
+
+    TITLE = "[Low level] Create State From URL"
+    DESCRIPTION = "Create a new state id from the URL of an image."
+    CATEGORY = "Finegrain/low-level"
+    FUNCTION = "process"
+
+    @staticmethod
+    async def _process(
+        ctx: EditorAPIContext,
+        params: Params,
+    ) -> StateID:
+        # make some assertions
+        assert params.url.startswith(("http://", "https://")), "URL must be http or https"
+
+        # let the API download the image
+        stateid_image = await ctx.call_async.create_state_from_url(params.url)
+
+        return stateid_image
+
+    def process(
+        self,
+        url: str,
+    ) -> tuple[StateID]:
+        return (
+            _get_ctx().run_one_sync(
+                co=self._process,
+                params=Params(url=url),
+            ),
+        )
@@ -3,6 +3,7 @@ from typing import Any, Literal
 
 import torch
 
+from ..utils.cache import cache_outputs
 from ..utils.context import EditorAPIContext, StateID, _get_ctx
 from ..utils.image import image_to_tensor
 
@@ -14,6 +15,7 @@ class Params:
     resolution: Literal["FULL", "DISPLAY"]
 
 
+@cache_outputs
 class DownloadImage:
     @classmethod
     def INPUT_TYPES(cls) -> dict[str, Any]:
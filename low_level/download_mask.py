@@ -3,8 +3,9 @@ from typing import Any, Literal
 
 import torch
 
+from ..utils.cache import cache_outputs
 from ..utils.context import EditorAPIContext, StateID, _get_ctx
-from ..utils.image import image_to_tensor
+from ..utils.mask import expand_mask, image_to_mask
 
 
 @dataclass(kw_only=True)
@@ -14,6 +15,7 @@ class Params:
     resolution: Literal["FULL", "DISPLAY"]
 
 
+@cache_outputs
 class DownloadMask:
     @classmethod
     def INPUT_TYPES(cls) -> dict[str, Any]:
@@ -58,10 +60,8 @@ class DownloadMask:
         # download the image from the API
         pil_mask = await ctx.call_async.download_pil_image(params.mask)
 
-        # convert to tensor
-        tensor_mask = image_to_tensor(pil_mask).squeeze(0)
-
-        return tensor_mask
+        # decode to a compact mask
+        return image_to_mask(pil_mask)
 
     def process(
         self,
@@ -70,12 +70,14 @@ class DownloadMask:
         resolution: Literal["FULL", "DISPLAY"],
     ) -> tuple[torch.Tensor]:
         return (
-            _get_ctx().run_one_sync(
-                co=self._process,
-                params=Params(
-                    mask=mask,
-                    image_format=image_format,
-                    resolution=resolution,
+            expand_mask(
+                _get_ctx().run_one_sync(
+                    co=self._process,
+                    params=Params(
+                        mask=mask,
+                        image_format=image_format,
+                        resolution=resolution,
+                    ),
                 ),
             ),
         )
@@ -1,6 +1,7 @@
 from dataclasses import dataclass
 from typing import Any, get_args
 
+from ..utils.cache import cache_outputs
 from ..utils.context import EditorAPIContext, ErrorResult, Mode, StateID, _get_ctx
 
 
@@ -12,6 +13,7 @@ class Params:
     seed: int
 
 
+@cache_outputs
 class Eraser:
     @classmethod
     def INPUT_TYPES(cls) -> dict[str, Any]:
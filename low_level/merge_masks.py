@@ -0,0 +1,108 @@
+from dataclasses import dataclass
+from typing import Any, Literal
+
+from ..utils.cache import cache_outputs
+from ..utils.context import EditorAPIContext, ErrorResult, StateID, _get_ctx
+
+
+@dataclass(kw_only=True)
+class Params:
+    masks: list[StateID]
+    operation: Literal["union", "difference"]
+
+
+@cache_outputs
+class MergeMasks:
+    @classmethod
+    def INPUT_TYPES(cls) -> dict[str, Any]:
+        return {
+            "required": {
+                "mask_1": (
+                    "STATEID",
+                    {
+                        "tooltip": "The first mask stateid",
+                    },
+                ),
+                "mask_2": (
+                    "STATEID",
+                    {
+                        "tooltip": "The second mask stateid",
+                    },
+                ),
+                "operation": (
+                    [
+                        "union",
+                        "difference",
+                    ],
+                    {
+                        "tooltip": "Union of all the masks, or the first mask minus the others",
+                    },
+                ),
+            },
+            "optional": {
+                "mask_3": (
+                    "STATEID",
+                    {
+                        "tooltip": "An optional third mask stateid",
+                    },
+                ),
+                "mask_4": (
+                    "STATEID",
+                    {
+                        "tooltip": "An optional fourth mask stateid",
+                    },
+                ),
+                "mask_5": (
+                    "STATEID",
+                    {
+                        "tooltip": "An optional fifth mask stateid",
+                    },
+                ),
+            },
+        }
+
+    RETURN_TYPES = ("STATEID",)
+    RETURN_NAMES = ("mask",)
+
+    TITLE = "[Low level] Merge Masks"
+    DESCRIPTION = "Merge several masks into a single one."
+    CATEGORY = "Finegrain/low-level"
+    FUNCTION = "process"
+
+    @staticmethod
+    async def _process(
+        ctx: EditorAPIContext,
+        params: Params,
+    ) -> StateID:
+        assert len(params.masks) >= 2, "At least two masks are needed"
+
+        # call merge-masks skill
+        result_merge = await ctx.call_async.merge_masks(
+            state_ids=params.masks,
+            operation=params.operation,
+        )
+        if isinstance(result_merge, ErrorResult):
+            raise ValueError(f"Failed to merge masks: {result_merge.error}")
+        stateid_merge = result_merge.state_id
+
+        return stateid_merge
+
+    def process(
+        self,
+        mask_1: StateID,
+        mask_2: StateID,
+        operation: Literal["union", "difference"],
+        mask_3: StateID | None = None,
+        mask_4: StateID | None = None,
+        mask_5: StateID | None = None,
+    ) -> tuple[StateID]:
+        masks = [mask for mask in (mask_1, mask_2, mask_3, mask_4, mask_5) if mask is not None]
+        return (
+            _get_ctx().run_one_sync(
+                co=self._process,
+                params=Params(
+                    masks=masks,
+                    operation=operation,
+                ),
+            ),
+        )
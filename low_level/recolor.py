@@ -1,6 +1,7 @@
 from dataclasses import dataclass
 from typing import Any
 
+from ..utils.cache import cache_outputs
 from ..utils.context import EditorAPIContext, ErrorResult, StateID, _get_ctx
 
 
@@ -11,6 +12,7 @@ class Params:
     color: str
 
 
+@cache_outputs
 class Recolor:
     @classmethod
     def INPUT_TYPES(cls) -> dict[str, Any]:
@@ -0,0 +1,109 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Literal
+
+from ..utils.context import EditorAPIContext, StateID, _get_ctx
+
+try:
+    import folder_paths  # type: ignore
+except ImportError:  # not running inside ComfyUI
+    folder_paths = None
+
+
+@dataclass(kw_only=True)
+class Params:
+    images: list[StateID]
+    filename_prefix: str
+    image_format: Literal["JPEG", "PNG", "WEBP", "AUTO"]
+    resolution: Literal["FULL", "DISPLAY"]
+
+
+class SaveImage:
+    @classmethod
+    def INPUT_TYPES(cls) -> dict[str, Any]:
+        return {
+            "required": {
+                "image": (
+                    "STATEID",
+                    {
+                        "tooltip": "The image stateid to save, or a list of them to save concurrently",
+                    },
+                ),
+                "filename_prefix": (
+                    "STRING",
+                    {
+                        "default": "Finegrain",
+                        "tooltip": "The prefix of the saved files, may contain a subfolder",
+                    },
+                ),
+                "image_format": (
+                    [
+                        "AUTO",
+                        "JPEG",
+                        "PNG",
+                        "WEBP",
+                    ],
+                ),
+                "resolution": (
+                    [
+                        "FULL",
+                        "DISPLAY",
+                    ],
+                ),
+            },
+        }
+
+    INPUT_IS_LIST = True
+    RETURN_TYPES = ()
+    OUTPUT_NODE = True
+
+    TITLE = "[Low level] Save Image"
+    DESCRIPTION = "Save images from state ids to the output directory, without decoding them."
+    CATEGORY = "Finegrain/low-level"
+    FUNCTION = "process"
+
+    @staticmethod
+    async def _process(
+        ctx: EditorAPIContext,
+        params: Params,
+    ) -> list[dict[str, str]]:
+        # make some assertions
+        assert folder_paths is not None, "Saving images requires ComfyUI"
+
+        # reserve the file names, the same way SaveImage does
+        output_dir = folder_paths.get_output_directory()  # type: ignore
+        folder, filename, counter, subfolder, _ = folder_paths.get_save_image_path(params.filename_prefix, output_dir)  # type: ignore
+        paths = [Path(folder) / f"{filename}_{counter + i:05}_" for i in range(len(params.images))]  # type: ignore
+
+        # stream the images to disk concurrently
+        saved: list[Path] = await ctx.gather(
+            *(
+                ctx.call_async.save_image(
+                    st,
+                    path,
+                    image_format=params.image_format,
+                    resolution=params.resolution,
+                )
+                for st, path in zip(params.images, paths, strict=True)
+            )
+        )
+
+        return [{"filename": path.name, "subfolder": subfolder, "type": "output"} for path in saved]  # type: ignore
+
+    def process(
+        self,
+        image: list[StateID],
+        filename_prefix: list[str],
+        image_format: list[Literal["JPEG", "PNG", "WEBP", "AUTO"]],
+        resolution: list[Literal["FULL", "DISPLAY"]],
+    ) -> dict[str, Any]:
+        images = _get_ctx().run_one_sync(
+            co=self._process,
+            params=Params(
+                images=image,
+                filename_prefix=filename_prefix[0],
+                image_format=image_format[0],
+                resolution=resolution[0],
+            ),
+        )
+        return {"ui": {"images": images}}
@@ -2,6 +2,7 @@ from dataclasses import dataclass
 from typing import Any
 
 from ..utils.bbox import BoundingBox
+from ..utils.cache import cache_outputs
 from ..utils.context import EditorAPIContext, ErrorResult, StateID, _get_ctx
 
 
@@ -12,6 +13,7 @@ class Params:
     cropped: bool
 
 
+@cache_outputs
 class Segment:
     @classmethod
     def INPUT_TYPES(cls) -> dict[str, Any]:
@@ -0,0 +1,93 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from ..utils.context import EditorAPIContext, StateID, _get_ctx
+from ..utils.fingerprint import fingerprint
+
+try:
+    import folder_paths  # type: ignore
+except ImportError:  # not running inside ComfyUI
+    folder_paths = None
+
+
+def _input_files() -> list[str]:
+    if folder_paths is None:
+        return []
+    # same listing as LoadImage, only the image files
+    input_dir = Path(folder_paths.get_input_directory())  # type: ignore
+    files = [f.name for f in input_dir.iterdir() if f.is_file()]
+    return sorted(folder_paths.filter_files_content_types(files, ["image"]))  # type: ignore
+
+
+def _file_path(image: str) -> Path:
+    if folder_paths is None:
+        return Path(image)
+    return Path(folder_paths.get_annotated_filepath(image))  # type: ignore
+
+
+@dataclass(kw_only=True)
+class Params:
+    path: Path
+
+
+class UploadFile:
+    @classmethod
+    def INPUT_TYPES(cls) -> dict[str, Any]:
+        return {
+            "required": {
+                "image": (
+                    _input_files(),
+                    {
+                        "image_upload": True,
+                        "tooltip": "The image file to upload, as is",
+                    },
+                ),
+            },
+        }
+
+    RETURN_TYPES = ("STATEID",)
+    RETURN_NAMES = ("image",)
+
+    TITLE = "[Low level] Upload File"
+    DESCRIPTION = "Create a new state id from an image file, without decoding it."
+    CATEGORY = "Finegrain/low-level"
+    FUNCTION = "process"
+
+    @classmethod
+    def IS_CHANGED(cls, image: str) -> str:
+        # the file may change while keeping its name
+        path = _file_path(image)
+        if not path.is_file():
+            return ""  # reported by VALIDATE_INPUTS
+        return fingerprint(path.read_bytes())
+
+    @classmethod
+    def VALIDATE_INPUTS(cls, image: str) -> str | bool:
+        if not _file_path(image).is_file():
+            return f"Invalid image file: {image}"
+        return True
+
+    @staticmethod
+    async def _process(
+        ctx: EditorAPIContext,
+        params: Params,
+    ) -> StateID:
+        # make some assertions
+        assert params.path.is_file(), f"File {params.path} does not exist"
+
+        # upload the file to the API
+        stateid_image = await ctx.call_async.upload_file(params.path)
+
+        return stateid_image
+
+    def process(
+        self,
+        image: str,
+    ) -> tuple[StateID]:
+        return (
+            _get_ctx().run_one_sync(
+                co=self._process,
+                params=Params(path=_file_path(image)),
+            ),
+        )
@@ -3,6 +3,7 @@ from typing import Any
 
 import torch
 
+from ..utils.cache import cache_outputs
 from ..utils.context import EditorAPIContext, StateID, _get_ctx
 from ..utils.image import tensor_to_image
 
@@ -12,6 +13,7 @@ class Params:
     image: torch.Tensor
 
 
+@cache_outputs
 class UploadImage:
     @classmethod
     def INPUT_TYPES(cls) -> dict[str, Any]:
@@ -3,8 +3,9 @@ from typing import Any
 
 import torch
 
+from ..utils.cache import cache_outputs
 from ..utils.context import EditorAPIContext, StateID, _get_ctx
-from ..utils.image import tensor_to_image
+from ..utils.mask import mask_to_image, union
 
 
 @dataclass(kw_only=True)
@@ -12,6 +13,7 @@ class Params:
     mask: torch.Tensor
 
 
+@cache_outputs
 class UploadMask:
     @classmethod
     def INPUT_TYPES(cls) -> dict[str, Any]:
@@ -20,7 +22,7 @@ class UploadMask:
                 "mask": (
                     "MASK",
                     {
-                        "tooltip": "The mask to upload",
+                        "tooltip": "The mask to upload, the union of a batch of masks is uploaded",
                     },
                 ),
             },
@@ -39,11 +41,11 @@ class UploadMask:
         ctx: EditorAPIContext,
         params: Params,
     ) -> StateID:
-        # convert tensors to PIL images
-        pil_mask = tensor_to_image(params.mask.unsqueeze(0))
+        # a state holds a single mask, batches are merged
+        pil_mask = mask_to_image(union(params.mask))
 
         # make some assertions
-        assert pil_mask.mode == "L", "Mask must be L mode"
+        assert pil_mask.mode in ("1", "L"), "Mask must be 1 or L mode"
 
         # upload the mask to the API
         stateid_mask = await ctx.call_async.upload_pil_image(pil_mask)
@@ -1,3 +1,4 @@
+import math
 from typing import Any
 
 import torch
@@ -7,6 +8,57 @@ from .context import BoundingBox
 from .image import image_to_tensor, tensor_to_image
 
 
+def is_degenerate(bbox: BoundingBox) -> bool:
+    return bbox[2] <= bbox[0] or bbox[3] <= bbox[1]
+
+
+def is_outside(bbox: BoundingBox, width: int, height: int) -> bool:
+    return bbox[0] >= width or bbox[1] >= height or bbox[2] <= 0 or bbox[3] <= 0
+
+
+def expand(bbox: BoundingBox, margin: int, width: int, height: int) -> BoundingBox:
+    return (
+        max(bbox[0] - margin, 0),
+        max(bbox[1] - margin, 0),
+        min(bbox[2] + margin, width),
+        min(bbox[3] + margin, height),
+    )
+
+
+def rescale(bbox: BoundingBox, src: tuple[int, int], dst: tuple[int, int]) -> BoundingBox:
+    # map a bounding box from an image of size src (width, height) to one of size dst
+    sx, sy = dst[0] / src[0], dst[1] / src[1]
+    return (
+        max(math.floor(bbox[0] * sx), 0),
+        max(math.floor(bbox[1] * sy), 0),
+        min(math.ceil(bbox[2] * sx), dst[0]),
+        min(math.ceil(bbox[3] * sy), dst[1]),
+    )
+
+
+def mask_bbox(mask: torch.Tensor) -> BoundingBox | None:
+    # bounding box of the pixels of a MASK (B, H, W) which don't quantize to zero
+    nonzero = mask >= 1 / 255
+    rows = torch.nonzero(nonzero.any(dim=2).any(dim=0))
+    cols = torch.nonzero(nonzero.any(dim=1).any(dim=0))
+    if rows.numel() == 0:
+        return None
+    return (int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1)
+
+
+def crop(tensor: torch.Tensor, bbox: BoundingBox) -> torch.Tensor:
+    # crop the spatial dimensions of an IMAGE (B, H, W, C) or MASK (B, H, W) tensor
+    return tensor[:, bbox[1] : bbox[3], bbox[0] : bbox[2]]
+
+
+def paste(tensor: torch.Tensor, patch: torch.Tensor, bbox: BoundingBox) -> torch.Tensor:
+    # inverse of crop, on a copy of the tensor
+    assert patch.shape[1:3] == (bbox[3] - bbox[1], bbox[2] - bbox[0]), "Patch size does not match bounding box"
+    result = tensor.clone()
+    result[:, bbox[1] : bbox[3], bbox[0] : bbox[2]] = patch
+    return result
+
+
 class CreateBoundingBox:
     @classmethod
     def INPUT_TYPES(cls) -> dict[str, Any]:
@@ -129,7 +181,7 @@ class ImageCropBoundingBox:
         image: torch.Tensor,
         bbox: BoundingBox,
     ) -> tuple[torch.Tensor]:
-        image = image[:, bbox[1] : bbox[3], bbox[0] : bbox[2]]
+        image = crop(image, bbox)
         return (image,)
 
 
@@ -166,5 +218,5 @@ class MaskCropBoundingBox:
         mask: torch.Tensor,
         bbox: BoundingBox,
     ) -> tuple[torch.Tensor]:
-        mask = mask[:, bbox[1] : bbox[3], bbox[0] : bbox[2]]
+        mask = crop(mask, bbox)
         return (mask,)
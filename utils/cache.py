@@ -0,0 +1,137 @@
+import functools
+import hashlib
+import sys
+import time
+from collections import OrderedDict
+from typing import Any
+
+import torch
+
+from .context import STATEID_TTL, _get_config
+from .fingerprint import fingerprint as tensor_fingerprint
+from .mask import compact_mask, expand_mask
+
+
+def _update(h: Any, value: Any) -> None:
+    match value:
+        case torch.Tensor():
+            h.update(f"tensor:{tensor_fingerprint(value)};".encode())
+        case list() | tuple():
+            h.update(f"{type(value).__name__}:{len(value)}:".encode())  # type: ignore[reportUnknownArgumentType]
+            for item in value:  # type: ignore[reportUnknownVariableType]
+                _update(h, item)
+        case dict():
+            h.update(f"dict:{len(value)}:".encode())  # type: ignore[reportUnknownArgumentType]
+            for k in sorted(value):  # type: ignore[reportUnknownVariableType]
+                _update(h, k)
+                _update(h, value[k])
+        case _:
+            h.update(f"{type(value).__name__}:{value!r};".encode())
+
+
+def fingerprint(value: Any) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    _update(h, value)
+    return h.hexdigest()
+
+
+def _nbytes(value: Any) -> int:
+    match value:
+        case torch.Tensor():
+            return value.nbytes
+        case list() | tuple():
+            return sum(_nbytes(item) for item in value)  # type: ignore[reportUnknownVariableType]
+        case _:
+            return sys.getsizeof(value)
+
+
+class OutputCache:
+    def __init__(self, max_bytes: int = 0) -> None:
+        self.outputs = OrderedDict[tuple[str, str], tuple[tuple[Any, ...], int, float | None]]()
+        self.max_bytes = max_bytes
+        self.num_bytes = 0
+
+    def _pop(self, key: tuple[str, str]) -> None:
+        _, size, _ = self.outputs.pop(key)
+        self.num_bytes -= size
+
+    def get(self, key: tuple[str, str]) -> tuple[Any, ...] | None:
+        entry = self.outputs.get(key)
+        if entry is None:
+            return None
+        outputs, _, expires = entry
+        if expires is not None and time.monotonic() > expires:
+            self._pop(key)
+            return None
+        self.outputs.move_to_end(key)
+        return outputs
+
+    def put(self, key: tuple[str, str], outputs: tuple[Any, ...], ttl: float | None = None) -> None:
+        if key in self.outputs:
+            self._pop(key)
+        size = _nbytes(outputs)
+        if size > self.max_bytes:
+            return
+        expires = None if ttl is None else time.monotonic() + ttl
+        self.outputs[key] = (outputs, size, expires)
+        self.num_bytes += size
+        while self.num_bytes > self.max_bytes:
+            self._pop(next(iter(self.outputs)))
+
+
+def _compact(outputs: tuple[Any, ...], types: tuple[str, ...]) -> tuple[Any, ...]:
+    # keep masks as uint8 while cached, when it is lossless
+    return tuple(
+        compact
+        if kind == "MASK" and isinstance(output, torch.Tensor) and (compact := compact_mask(output)) is not None
+        else output
+        for output, kind in zip(outputs, types, strict=True)
+    )
+
+
+def _expand(outputs: tuple[Any, ...], types: tuple[str, ...]) -> tuple[Any, ...]:
+    return tuple(
+        expand_mask(output) if kind == "MASK" and isinstance(output, torch.Tensor) else output
+        for output, kind in zip(outputs, types, strict=True)
+    )
+
+
+@functools.cache
+def _get_cache() -> OutputCache:
+    try:
+        cache_size = _get_config().getint("finegrain", "cache_size", fallback=0)
+    except FileNotFoundError:
+        cache_size = 0
+    return OutputCache(max_bytes=cache_size * 2**20)
+
+
+def cache_outputs[T](cls: type[T]) -> type[T]:
+    # Decorate a node class so that it exposes a fingerprint of its inputs to ComfyUI,
+    # and returns the outputs of previous runs with the same inputs without calling the API.
+    node: Any = cls
+    title: str = node.TITLE
+    function: str = node.FUNCTION
+    types: tuple[str, ...] = node.RETURN_TYPES
+    ttl = STATEID_TTL if "STATEID" in types else None
+    process = getattr(node, function)
+
+    @functools.wraps(process)
+    def cached_process(self: T, *args: Any, **kwargs: Any) -> tuple[Any, ...]:
+        cache = _get_cache()
+        if cache.max_bytes <= 0:
+            # disabled, don't pay for fingerprinting the inputs
+            return process(self, *args, **kwargs)
+        key = (title, fingerprint((args, kwargs)))
+        if (outputs := cache.get(key)) is not None:
+            return _expand(outputs, types)
+        outputs = process(self, *args, **kwargs)
+        cache.put(key, _compact(outputs, types), ttl=ttl)
+        return outputs
+
+    def IS_CHANGED(cls: type[T], **kwargs: Any) -> str:
+        # ComfyUI only passes the widget values here, not the linked inputs
+        return fingerprint(kwargs)
+
+    setattr(node, function, cached_process)
+    node.IS_CHANGED = classmethod(IS_CHANGED)
+    return cls
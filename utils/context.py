@@ -1,25 +1,36 @@
 # Modified from https://github.com/finegrain-ai/finegrain-python/blob/eaa3cb5a77a889a8f738e4f35c780399bfc3e8a9/finegrain/src/finegrain/__init__.py
 
 import asyncio
+import concurrent.futures
 import configparser
+import contextvars
 import dataclasses as dc
 import io
 import json
 import logging
+import os
 import random
 import re
+import threading
+import time
 import tomllib
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 from collections.abc import AsyncIterator, Awaitable, Callable, Mapping
+from contextlib import asynccontextmanager, nullcontext
 from functools import cache
 from pathlib import Path
 from typing import Any, BinaryIO, Literal, NewType, cast, get_args
 
 import httpx
 import httpx_sse
+import numpy as np
 from httpx._types import QueryParamTypes, RequestData, RequestFiles
 from PIL import Image
 
+from .fingerprint import image_fingerprint
+from .image import downscale
+from .mask import is_binary
+
 logger = logging.getLogger(__name__)
 
 Priority = Literal["low", "standard", "high"]
@@ -40,6 +51,25 @@ def check_status(response: httpx.Response) -> None:
         raise exc from e
 
 
+# set while a task holds a slot of the concurrency limit, so that nested API calls don't wait on themselves
+_limited = contextvars.ContextVar("limited", default=False)
+
+
+class FileTooLarge(ValueError):
+    pass
+
+
+def is_file_too_large(response: httpx.Response) -> bool:
+    return response.status_code == 413 or (response.is_error and "file_too_large" in response.text)
+
+
+IMAGE_SUFFIXES = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+}
+
+
 class SSELoopStopped(RuntimeError):
     first_error: Exception | None
     last_error: Exception | None
@@ -94,6 +124,87 @@ class Futures[Tk, Tv]:
             pass
 
 
+type ProvenanceKey = tuple[str, tuple[int, int], str]
+
+
+# states live on the API and may be deleted there, do not reuse them for too long
+STATEID_TTL = 10 * 60
+
+
+class Provenance:
+    # Content-addressed record of the images the API already holds a state for,
+    # keyed on the decoded pixels so any equal tensor round-trip finds it back.
+    # States still being uploaded in the background are recorded as futures,
+    # states expire ttl seconds after being recorded.
+
+    def __init__(self, capacity: int = 64, ttl: float = STATEID_TTL) -> None:
+        self.states = OrderedDict[ProvenanceKey, tuple[StateID | concurrent.futures.Future[StateID], float]]()
+        self.capacity = capacity
+        self.ttl = ttl
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(image: Image.Image) -> ProvenanceKey:
+        return image.mode, image.size, image_fingerprint(image)
+
+    def cull(self) -> None:
+        while len(self.states) > self.capacity:
+            self.states.popitem(last=False)
+
+    def known(self, image: Image.Image) -> bool:
+        # cheap check to avoid hashing images which cannot possibly match
+        with self.lock:
+            return any(mode == image.mode and size == image.size for mode, size, _ in self.states)
+
+    def _get(self, key: ProvenanceKey) -> StateID | concurrent.futures.Future[StateID] | None:
+        # to be called with the lock held
+        entry = self.states.get(key)
+        if entry is None:
+            return None
+        state, expires = entry
+        if time.monotonic() > expires:
+            del self.states[key]
+            return None
+        return state
+
+    def _set(self, key: ProvenanceKey, state: StateID | concurrent.futures.Future[StateID]) -> None:
+        with self.lock:
+            self.states[key] = (state, time.monotonic() + self.ttl)
+            self.states.move_to_end(key)
+            self.cull()
+
+    def record(self, image: Image.Image, state_id: StateID) -> None:
+        self._set(self.key(image), state_id)
+
+    def reserve(self, image: Image.Image) -> tuple[ProvenanceKey, concurrent.futures.Future[StateID]] | None:
+        key = self.key(image)
+        with self.lock:
+            if self._get(key) is not None:
+                return None
+        future = concurrent.futures.Future[StateID]()
+        self._set(key, future)
+        return key, future
+
+    def resolve(self, key: ProvenanceKey, future: concurrent.futures.Future[StateID]) -> None:
+        with self.lock:
+            if self._get(key) is not future:
+                return
+            if future.exception() is None:
+                self.states[key] = (future.result(), time.monotonic() + self.ttl)
+            else:
+                del self.states[key]
+
+    def lookup(self, image: Image.Image) -> StateID | concurrent.futures.Future[StateID] | None:
+        if not self.known(image):
+            return None
+        key = self.key(image)
+        with self.lock:
+            state = self._get(key)
+            if state is not None:
+                self.states.move_to_end(key)
+            return state
+
+
 class RetryContext:
     max_failures: int
     max_jitter: float
@@ -311,10 +422,14 @@ class EditorAPIContext:
     verify: bool | str
     default_timeout: float
     user_agent: str
+    max_concurrency: int
 
     token: str | None
     logger: logging.Logger
     credits: int | None = None
+    provenance: Provenance
+    bytes_sent: int
+    bytes_received: int
 
     _client: httpx.AsyncClient | None
     _client_ctx_depth: int
@@ -322,6 +437,7 @@ class EditorAPIContext:
     _sse_source: ResilientEventSource
     _sse_task: asyncio.Task[None] | None
     _ping_interval: float
+    _semaphore: tuple[asyncio.AbstractEventLoop, asyncio.Semaphore] | None
 
     def __init__(
         self,
@@ -334,11 +450,13 @@ class EditorAPIContext:
         verify: bool | str = True,
         default_timeout: float = 60.0,
         user_agent: str | None = None,
+        max_concurrency: int = 4,
     ) -> None:
         self.base_url = base_url or "https://api.finegrain.ai/editor"
         self.priority = priority
         self.verify = verify
         self.default_timeout = default_timeout
+        self.max_concurrency = max_concurrency
 
         if credentials is not None:
             if (m := API_KEY_PATTERN.match(credentials)) is not None:
@@ -361,6 +479,10 @@ class EditorAPIContext:
             self.user_agent = f"{user_agent} ({client_ua})"
 
         self.logger = logger
+        self.provenance = Provenance()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self._semaphore = None
         self._sse_source = ResilientEventSource(
             url=self.get_sub_url,
             ping_interval=self.get_ping_interval,
@@ -415,6 +537,22 @@ class EditorAPIContext:
         self.credits = r["user"]["credits"]
         self.token = r["token"]
 
+    @asynccontextmanager
+    async def limit(self) -> AsyncIterator[None]:
+        # at most max_concurrency API calls in flight on this context, however the tasks making them are nested
+        if _limited.get():
+            yield
+            return
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore[0] is not loop:
+            self._semaphore = (loop, asyncio.Semaphore(self.max_concurrency))
+        async with self._semaphore[1]:
+            token = _limited.set(True)
+            try:
+                yield
+            finally:
+                _limited.reset(token)
+
     async def request(
         self,
         method: Literal["GET", "POST"],
@@ -425,7 +563,15 @@ class EditorAPIContext:
         json: dict[str, Any] | None = None,
         headers: Mapping[str, str] | None = None,
         raise_for_status: bool = True,
+        content: Callable[[], AsyncIterator[bytes]] | None = None,
+        limited: bool = True,
     ) -> httpx.Response:
+        # a streamed body is sent with chunked encoding, it is created anew for each attempt
+        async def _counted(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+            async for chunk in chunks:
+                self.bytes_sent += len(chunk)
+                yield chunk
+
         async def _q() -> httpx.Response:
             return await client.request(
                 method,
@@ -435,21 +581,25 @@ class EditorAPIContext:
                 data=data,
                 params=params,
                 json=json,
+                content=None if content is None else _counted(content()),
             )
 
-        async with self as client:
+        async with self.limit() if limited else nullcontext(), self as client:
             r = await _q()
             if r.status_code == 401:
                 self.logger.debug("renewing token")
                 await self.login()
                 r = await _q()
 
+        self.bytes_sent += int(r.request.headers.get("Content-Length", 0))
+        self.bytes_received += len(r.content)
         if raise_for_status:
             check_status(r)
         return r
 
     async def get_sub_url(self) -> str:
-        response = await self.request("POST", "sub-auth")
+        # the SSE loop must reconnect even when all the slots wait on it
+        response = await self.request("POST", "sub-auth", limited=False)
         jdata = response.json()
         sub_token = jdata["token"]
         self._ping_interval = float(jdata.get("ping_interval", 0.0))
@@ -526,6 +676,36 @@ class EditorAPIContext:
         response = await self.request("GET", f"state/image/{state_id}", params=params)
         return response.content
 
+    @asynccontextmanager
+    async def stream_image(
+        self,
+        state_id: StateID,
+        image_format: Literal["JPEG", "PNG", "WEBP", "AUTO"] = "AUTO",
+        resolution: Literal["FULL", "DISPLAY"] = "FULL",
+    ) -> AsyncIterator[httpx.Response]:
+        # same as get_image, but the body is left for the caller to iterate over
+        params = {"format": image_format, "resolution": resolution}
+        async with self.limit(), self as client:
+            for renew in (True, False):
+                async with client.stream(
+                    "GET",
+                    f"{self.base_url}/state/image/{state_id}",
+                    headers=self.auth_headers,
+                    params=params,
+                ) as r:
+                    if r.status_code == 401 and renew:
+                        self.logger.debug("renewing token")
+                        await self.login()
+                        continue
+                    if not r.is_success:
+                        await r.aread()
+                        check_status(r)
+                    try:
+                        yield r
+                    finally:
+                        self.bytes_received += r.num_bytes_downloaded
+                    return
+
     async def _run_one[Tin, Tout](
         self,
         co: Callable[["EditorAPIContext", Tin], Awaitable[Tout]],
@@ -534,6 +714,7 @@ class EditorAPIContext:
         # This wraps the coroutine in the SSE loop.
         # This is mostly useful if you use synchronous Python,
         # otherwise you can call the functions directly.
+        start, sent, received = time.perf_counter(), self.bytes_sent, self.bytes_received
         if not self.token:
             await self.login()
         await self.sse_start()
@@ -542,6 +723,14 @@ class EditorAPIContext:
             return r
         finally:
             await self.sse_stop()
+            self.logger.info(
+                f"{getattr(co, '__qualname__', co)} took {time.perf_counter() - start:.2f}s, "
+                f"sent {self.bytes_sent - sent} bytes, received {self.bytes_received - received} bytes"
+            )
+
+    async def gather[T](self, *aws: Awaitable[T]) -> list[T]:
+        # like asyncio.gather, the API calls made by the awaitables are bounded by limit()
+        return list(await asyncio.gather(*aws))
 
     def run_one_sync[Tin, Tout](
         self,
@@ -562,9 +751,10 @@ class EditorAPIContext:
         timeout: float | None = None,
     ) -> tuple[StateID, bool]:
         params = {"priority": self.priority} | (params or {})
-        response = await self.request("POST", f"skills/{url}", json=params)
-        state_id: StateID = response.json()["state"]
-        status = await self.sse_await(state_id, timeout=timeout)
+        async with self.limit():
+            response = await self.request("POST", f"skills/{url}", json=params)
+            state_id: StateID = response.json()["state"]
+            status = await self.sse_await(state_id, timeout=timeout)
         return state_id, status
 
     async def ensure_skill(
@@ -873,6 +1063,160 @@ class ImageOutParams:
     resolution: Literal["FULL", "DISPLAY"] = "FULL"
 
 
+async def iter_png(image: Image.Image, chunk_size: int = 1 << 16, max_chunks: int = 16) -> AsyncIterator[bytes]:
+    # encode in a worker thread, yielding chunks as soon as they are written,
+    # the thread waits while max_chunks are pending so that the PNG is never held whole
+    loop = asyncio.get_running_loop()
+    chunks: asyncio.Queue[bytes | None] = asyncio.Queue(maxsize=max_chunks)
+    stopped = threading.Event()
+    buffer = bytearray()
+
+    def put(chunk: bytes | None) -> None:
+        if stopped.is_set():
+            raise RuntimeError("PNG consumer stopped")
+        asyncio.run_coroutine_threadsafe(chunks.put(chunk), loop).result()
+
+    class Writer(io.RawIOBase):
+        def writable(self) -> bool:
+            return True
+
+        def write(self, b: Any) -> int:
+            buffer.extend(b)
+            if len(buffer) >= chunk_size:
+                put(bytes(buffer))
+                buffer.clear()
+            return len(b)
+
+    def encode() -> None:
+        try:
+            image.save(cast(BinaryIO, Writer()), format="PNG", optimize=True)
+            put(bytes(buffer))
+        finally:
+            if not stopped.is_set():
+                put(None)
+
+    encoding = loop.run_in_executor(None, encode)
+    try:
+        while (chunk := await chunks.get()) is not None:
+            yield chunk
+    finally:
+        # stop the encoder at its next write, unblocking it if it waits on a full queue
+        stopped.set()
+        while not chunks.empty():
+            chunks.get_nowait()
+        encoding.add_done_callback(lambda f: f.exception())
+    await encoding  # raises if the encoding failed
+
+
+class _ChunkReader(io.RawIOBase):
+    # a file over chunks read one after the other, keeping a window behind
+    # the position for the short seeks back decoders do, e.g. on the header
+
+    def __init__(self, next_chunk: Callable[[], bytes | None], window: int = 1 << 20) -> None:
+        super().__init__()
+        self.next_chunk = next_chunk
+        self.window = window
+        self.data = bytearray()
+        self.base = 0  # position of data[0] in the file
+        self.pos = 0
+        self.eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            raise io.UnsupportedOperation("cannot seek from the end of a stream")
+        if offset < self.base:
+            raise io.UnsupportedOperation(f"cannot seek back to {offset}, the stream starts at {self.base}")
+        self.pos = offset
+        return offset
+
+    def readinto(self, buffer: Any) -> int:
+        # fill the whole buffer unless the stream ends, decoders don't expect short reads
+        while self.pos + len(buffer) > self.base + len(self.data) and not self.eof:
+            chunk = self.next_chunk()
+            if chunk is None:
+                self.eof = True
+            else:
+                self.data += chunk
+        start = self.pos - self.base
+        n = max(0, min(len(buffer), len(self.data) - start))
+        buffer[:n] = self.data[start : start + n]
+        self.pos += n
+        if (drop := self.pos - self.base - self.window) > self.window:
+            del self.data[:drop]
+            self.base += drop
+        return n
+
+
+async def decode_image(chunks: AsyncIterator[bytes], max_chunks: int = 16) -> Image.Image:
+    # decode in a worker thread while the chunks arrive, through a queue of at most max_chunks,
+    # so that decoding overlaps the transfer and the encoded image is never held whole
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[bytes | None] = asyncio.Queue(maxsize=max_chunks)
+    reader = _ChunkReader(lambda: asyncio.run_coroutine_threadsafe(queue.get(), loop).result())
+
+    def decode() -> Image.Image:
+        image = Image.open(cast(BinaryIO, reader))
+        image.load()
+        return image
+
+    decoding = loop.run_in_executor(None, decode)
+
+    async def feed(chunk: bytes | None) -> bool:
+        # false once the decoder is done, it won't read any more chunks
+        if not queue.full():
+            queue.put_nowait(chunk)
+            return True
+        put = asyncio.ensure_future(queue.put(chunk))
+        await asyncio.wait((put, decoding), return_when=asyncio.FIRST_COMPLETED)
+        if not put.done():
+            put.cancel()
+            return False
+        return True
+
+    try:
+        async for chunk in chunks:
+            if decoding.done() or not await feed(chunk):
+                break
+        else:
+            await feed(None)
+    except BaseException:
+        # end the stream early, the decoder then fails on a truncated image
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+        decoding.add_done_callback(lambda f: f.exception())
+        raise
+    return await decoding
+
+
+async def iter_multipart(
+    name: str,
+    filename: str,
+    content_type: str,
+    chunks: AsyncIterator[bytes],
+    boundary: str,
+) -> AsyncIterator[bytes]:
+    yield (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode()
+    async for chunk in chunks:
+        yield chunk
+    yield f"\r\n--{boundary}--\r\n".encode()
+
+
 class EditorApiAsyncClient:
     def __init__(self, ctx: EditorAPIContext) -> None:
         self.ctx = ctx
@@ -1217,24 +1561,99 @@ class EditorApiAsyncClient:
             return await self._response_with_image(st, ok, SetBackgroundColorResultWithImage, params=image_params)
         return await self._response(st, ok, SetBackgroundColorResult)
 
-    async def upload_pil_image(self, image: Image.Image) -> StateID:
-        data = io.BytesIO()
-        image.save(data, format="PNG", optimize=True)
-        response = await self.ctx.request("POST", "state/upload", files={"file": data})
+    async def find_state(self, image: Image.Image) -> StateID | None:
+        # the state already holding these pixels, waiting for it while it is being uploaded
+        state = self.ctx.provenance.lookup(image)
+        if isinstance(state, concurrent.futures.Future):
+            try:
+                state = await asyncio.wrap_future(state)
+            except Exception as e:
+                self.ctx.logger.warning(f"background upload failed, uploading again: {e}")
+                state = None
+        return state
+
+    async def upload_downscaled(self, image: Image.Image, max_side: int) -> tuple[StateID, Size2D]:
+        # for skills which don't need the full resolution, unless the image already is on the API,
+        # returns the state along with the size of the image it holds
+        if (state := await self.find_state(image)) is not None:
+            return state, image.size
+        upload = downscale(image, max_side)
+        # it is only worth looking up again if it was downscaled
+        return await self.upload_pil_image(upload, reuse=upload is not image), upload.size
+
+    async def upload_pil_image(self, image: Image.Image, reuse: bool = True) -> StateID:
+        if reuse and (state := await self.find_state(image)) is not None:
+            self.ctx.logger.debug(f"reusing state {state} instead of uploading")
+            return state
+        # stream the PNG while it is being encoded
+        boundary = os.urandom(16).hex()
+        response = await self.ctx.request(
+            "POST",
+            "state/upload",
+            headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+            content=lambda: iter_multipart("file", "image.png", "image/png", iter_png(image), boundary),
+            raise_for_status=False,
+        )
+        if is_file_too_large(response):
+            raise FileTooLarge(f"image of size {image.size} is too large for the API: {response.text}")
+        check_status(response)
+        state_id = response.json()["state"]
+        self.ctx.provenance.record(image, state_id)
+        return state_id
+
+    async def upload_file(self, path: str | Path) -> StateID:
+        # send the file as is, the server decodes it
+        path = Path(path)
+        with path.open("rb") as f:
+            response = await self.ctx.request("POST", "state/upload", files={"file": (path.name, f)})
         return response.json()["state"]
 
+    async def create_state_from_url(self, url: str) -> StateID:
+        # the server fetches the image itself, nothing goes through our network
+        result = await self.create_state(file_url=url)
+        if isinstance(result, ErrorResult):
+            raise ValueError(f"Failed to create state from {url}: {result.error}")
+        return result.state_id
+
+    async def save_image(
+        self,
+        st: StateID,
+        path: Path,
+        image_format: Literal["JPEG", "PNG", "WEBP", "AUTO"] = "AUTO",
+        resolution: Literal["FULL", "DISPLAY"] = "FULL",
+    ) -> Path:
+        # write the encoded image as is, the suffix is appended from its actual format
+        async with self.ctx.stream_image(st, image_format=image_format, resolution=resolution) as response:
+            content_type = response.headers.get("Content-Type", "").split(";")[0]
+            if content_type not in IMAGE_SUFFIXES:
+                raise ValueError(f"Failed to save {st}: unexpected content type {content_type!r}")
+            # not with_suffix, the name may contain dots
+            path = path.with_name(path.name + IMAGE_SUFFIXES[content_type])
+            with path.open("wb") as f:
+                async for chunk in response.aiter_bytes():
+                    f.write(chunk)
+        return path
+
     async def download_pil_image(
         self,
         st: StateID,
         image_format: Literal["JPEG", "PNG", "WEBP", "AUTO"] = "AUTO",
         resolution: Literal["FULL", "DISPLAY"] = "FULL",
     ) -> Image.Image:
-        response = await self.ctx.get_image(state_id=st, image_format=image_format, resolution=resolution)
-        return Image.open(io.BytesIO(response))
+        # decode the chunks while they arrive
+        async with self.ctx.stream_image(st, image_format=image_format, resolution=resolution) as response:
+            image = await decode_image(response.aiter_bytes())
+        # only lossless full resolution downloads hold the exact pixels of the state
+        if resolution == "FULL" and image.format == "PNG":
+            self.ctx.provenance.record(image, st)
+            # binary masks are uploaded as 1-bit images, see mask_to_image
+            if image.mode == "L" and is_binary(np.asarray(image)):
+                self.ctx.provenance.record(image.convert("1", dither=Image.Dither.NONE), st)
+        return image
 
 
 @cache
-def _get_ctx() -> EditorAPIContext:
+def _get_config() -> configparser.ConfigParser:
     config_path = Path(__file__).parent.parent / "config.ini"
     if not config_path.exists():
         raise FileNotFoundError(f"config file not found at {config_path}")
@@ -1242,9 +1661,16 @@ def _get_ctx() -> EditorAPIContext:
     config = configparser.ConfigParser()
     config.read(config_path)
 
+    return config
+
+
+def _create_ctx() -> EditorAPIContext:
+    config = _get_config()
+
     credentials = config.get("finegrain", "credentials")
     priority = config.get("finegrain", "priority")
     timeout = config.getfloat("finegrain", "timeout")
+    max_concurrency = config.getint("finegrain", "max_concurrency", fallback=4)
 
     assert priority in get_args(Priority), f"invalid priority {priority}, must be one of {get_args(Priority)}"
     priority = cast(Priority, priority)
@@ -1265,6 +1691,12 @@ def _get_ctx() -> EditorAPIContext:
         priority=priority,
         default_timeout=timeout,
         user_agent=user_agent,
+        max_concurrency=max_concurrency,
     )
 
     return ctx
+
+
+@cache
+def _get_ctx() -> EditorAPIContext:
+    return _create_ctx()
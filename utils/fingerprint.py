@@ -0,0 +1,121 @@
+import hashlib
+import os
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
+
+import numpy as np
+import torch
+from PIL import Image
+
+try:
+    import xxhash  # type: ignore
+except ImportError:
+    xxhash = None
+
+CHUNK_SIZE = 1 << 22  # 4 MiB
+PARALLEL_THRESHOLD = 1 << 24  # 16 MiB
+SAMPLE_COUNT = 64
+SAMPLE_SIZE = 1 << 16  # 64 KiB
+
+
+@cache
+def _get_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="finegrain-hash")
+
+
+def _hash_chunk(chunk: memoryview) -> bytes:
+    # both hashes release the GIL on large buffers, so chunks are hashed in parallel
+    if xxhash is not None:
+        return xxhash.xxh3_128_digest(chunk)  # type: ignore
+    return hashlib.blake2b(chunk, digest_size=16).digest()
+
+
+def as_buffer(data: torch.Tensor | np.ndarray | bytes) -> tuple[str, memoryview]:
+    # zero-copy view of the raw bytes, along with what is needed to tell them apart
+    match data:
+        case torch.Tensor():
+            tensor = data.detach()
+            if tensor.device.type != "cpu":
+                tensor = tensor.cpu()
+            tensor = tensor.contiguous()  # no-op for the usual NHWC tensors
+            header = f"tensor:{tensor.dtype}:{tuple(tensor.shape)}"
+            array = tensor.view(torch.uint8).numpy()  # type: ignore[reportUnknownMemberType]
+        case np.ndarray():
+            header = f"array:{data.dtype}:{data.shape}"
+            array = np.ascontiguousarray(data).view(np.uint8)
+        case _:
+            header = "bytes"
+            array = np.frombuffer(data, dtype=np.uint8)
+    return header, memoryview(array.reshape(-1))
+
+
+def fingerprint(data: torch.Tensor | np.ndarray | bytes, sampled: bool = False) -> str:
+    header, buffer = as_buffer(data)
+    size = len(buffer)
+
+    if sampled and size > SAMPLE_COUNT * SAMPLE_SIZE:
+        # only hash evenly spaced windows: constant time, but blind to changes between them
+        step = (size - SAMPLE_SIZE) // (SAMPLE_COUNT - 1)
+        chunks = [buffer[i * step : i * step + SAMPLE_SIZE] for i in range(SAMPLE_COUNT)]
+        header += ":sampled"
+    else:
+        chunks = [buffer[i : i + CHUNK_SIZE] for i in range(0, size, CHUNK_SIZE)]
+
+    if size >= PARALLEL_THRESHOLD and len(chunks) > 1:
+        digests = list(_get_executor().map(_hash_chunk, chunks))
+    else:
+        digests = [_hash_chunk(chunk) for chunk in chunks]
+
+    h = hashlib.blake2b(f"{header}:{size}:".encode(), digest_size=16)
+    for digest in digests:
+        h.update(digest)
+    return h.hexdigest()
+
+
+def image_fingerprint(image: Image.Image) -> str:
+    # PIL images do not expose their pixels without copying them (np.asarray calls tobytes),
+    # so hash them as strips of rows instead of copying the whole image at once
+    width, height = image.size
+    rows = max(1, CHUNK_SIZE // max(1, width * len(image.getbands())))
+
+    def hash_strip(top: int) -> bytes:
+        strip = image.crop((0, top, width, min(height, top + rows)))
+        return _hash_chunk(memoryview(strip.tobytes()))
+
+    tops = range(0, height, rows)
+    if len(tops) > 1 and width * height * len(image.getbands()) >= PARALLEL_THRESHOLD:
+        digests = list(_get_executor().map(hash_strip, tops))
+    else:
+        digests = [hash_strip(top) for top in tops]
+
+    h = hashlib.blake2b(f"image:{image.mode}:{image.size}:".encode(), digest_size=16)
+    for digest in digests:
+        h.update(digest)
+    return h.hexdigest()
+
+
+def benchmark() -> None:
+    def timeit(f: Callable[[], object], repeat: int = 3) -> float:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            f()
+            best = min(best, time.perf_counter() - start)
+        return best * 1000
+
+    print(f"xxhash: {xxhash is not None}, threads: {_get_executor()._max_workers}")
+    print(f"{'size':>12} {'MB':>8} {'sha256(tobytes)':>16} {'fingerprint':>12} {'sampled':>8}")
+    for side in (512, 1024, 2048, 4096, 6000):
+        tensor = torch.rand(1, side, side, 3)
+        mb = tensor.numel() * tensor.element_size() / 1e6
+        naive = timeit(lambda: hashlib.sha256(tensor.numpy().tobytes()).digest())  # noqa: B023
+        full = timeit(lambda: fingerprint(tensor))  # noqa: B023
+        sampled = timeit(lambda: fingerprint(tensor, sampled=True))  # noqa: B023
+        print(f"{f'{side}x{side}':>12} {mb:>8.1f} {naive:>14.1f}ms {full:>10.1f}ms {sampled:>6.2f}ms")
+
+
+if __name__ == "__main__":
+    # python -m utils.fingerprint
+    benchmark()
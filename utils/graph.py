@@ -0,0 +1,198 @@
+import logging
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from ..high_level.blender import Blender as HighLevelBlender
+from ..high_level.box import Box as HighLevelBox
+from ..high_level.eraser import Eraser as HighLevelEraser
+from ..high_level.recolor import Recolor as HighLevelRecolor
+from ..high_level.segment import Segment as HighLevelSegment
+from ..high_level.shadow import Shadow as HighLevelShadow
+from ..low_level.blender import Blender as LowLevelBlender
+from ..low_level.box import Box as LowLevelBox
+from ..low_level.download_image import DownloadImage as LowLevelDownloadImage
+from ..low_level.download_mask import DownloadMask as LowLevelDownloadMask
+from ..low_level.eraser import Eraser as LowLevelEraser
+from ..low_level.recolor import Recolor as LowLevelRecolor
+from ..low_level.segment import Segment as LowLevelSegment
+from ..low_level.shadow import Shadow as LowLevelShadow
+from ..low_level.upload_image import UploadImage as LowLevelUploadImage
+from ..low_level.upload_mask import UploadMask as LowLevelUploadMask
+from .context import _get_config
+
+logger = logging.getLogger(__name__)
+
+type Prompt = dict[str, dict[str, Any]]
+
+# the name of the tensor input of the upload and download nodes
+UPLOAD_INPUTS = {
+    LowLevelUploadImage.TITLE: "image",
+    LowLevelUploadMask.TITLE: "mask",
+}
+DOWNLOAD_INPUTS = {
+    LowLevelDownloadImage.TITLE: "image",
+    LowLevelDownloadMask.TITLE: "mask",
+}
+
+
+@dataclass(kw_only=True)
+class Rule:
+    # the low level node replacing the high level one, it must take the same inputs
+    low_level: str
+    # tensor inputs of the high level node, and the node uploading them
+    uploads: dict[str, str]
+    # the node materializing the (single) output of the high level node, if it is a tensor
+    download: str | None
+    # whether the high level node inputs can be expressed with the low level node
+    fusable: Callable[[dict[str, Any]], bool] = field(default=lambda inputs: True)
+
+
+RULES: dict[str, Rule] = {
+    HighLevelBlender.TITLE: Rule(
+        low_level=LowLevelBlender.TITLE,
+        uploads={"scene": LowLevelUploadImage.TITLE, "cutout": LowLevelUploadImage.TITLE},
+        download=LowLevelDownloadImage.TITLE,
+        fusable=lambda inputs: inputs.get("variants", 1) == 1,
+    ),
+    HighLevelBox.TITLE: Rule(
+        low_level=LowLevelBox.TITLE,
+        uploads={"image": LowLevelUploadImage.TITLE},
+        download=None,
+        fusable=lambda inputs: not inputs.get("image_url"),
+    ),
+    HighLevelEraser.TITLE: Rule(
+        low_level=LowLevelEraser.TITLE,
+        uploads={"image": LowLevelUploadImage.TITLE, "mask": LowLevelUploadMask.TITLE},
+        download=LowLevelDownloadImage.TITLE,
+        fusable=lambda inputs: not inputs.get("roi", False) and inputs.get("variants", 1) == 1,
+    ),
+    HighLevelRecolor.TITLE: Rule(
+        low_level=LowLevelRecolor.TITLE,
+        uploads={"image": LowLevelUploadImage.TITLE, "mask": LowLevelUploadMask.TITLE},
+        download=LowLevelDownloadImage.TITLE,
+        fusable=lambda inputs: not inputs.get("roi", False),
+    ),
+    HighLevelSegment.TITLE: Rule(
+        low_level=LowLevelSegment.TITLE,
+        uploads={"image": LowLevelUploadImage.TITLE},
+        download=LowLevelDownloadMask.TITLE,
+        fusable=lambda inputs: not inputs.get("image_url"),
+    ),
+    HighLevelShadow.TITLE: Rule(
+        low_level=LowLevelShadow.TITLE,
+        uploads={"cutout": LowLevelUploadImage.TITLE},
+        download=LowLevelDownloadImage.TITLE,
+        fusable=lambda inputs: inputs.get("variants", 1) == 1,
+    ),
+}
+
+
+def is_link(value: Any) -> bool:
+    # links to other nodes outputs are serialized as [node_id, output_index]
+    return isinstance(value, list) and len(value) == 2 and isinstance(value[0], str) and isinstance(value[1], int)
+
+
+def find_chains(prompt: Prompt) -> set[str]:
+    candidates = {
+        node_id
+        for node_id, node in prompt.items()
+        if (rule := RULES.get(node.get("class_type", ""))) is not None and rule.fusable(node.get("inputs", {}))
+    }
+
+    # union-find over the links between candidates
+    parents = {node_id: node_id for node_id in candidates}
+
+    def root(node_id: str) -> str:
+        while parents[node_id] != node_id:
+            parents[node_id] = parents[parents[node_id]]
+            node_id = parents[node_id]
+        return node_id
+
+    for node_id in candidates:
+        for value in prompt[node_id]["inputs"].values():
+            if is_link(value) and value[0] in candidates:
+                parents[root(node_id)] = root(value[0])
+
+    sizes: dict[str, int] = {}
+    for node_id in candidates:
+        sizes[root(node_id)] = sizes.get(root(node_id), 0) + 1
+
+    # a lone node would only trade its transfers for as many upload and download nodes
+    return {node_id for node_id in candidates if sizes[root(node_id)] > 1}
+
+
+def fuse_prompt(prompt: Prompt) -> Prompt:
+    fused = find_chains(prompt)
+    if not fused:
+        return prompt
+
+    rules = {node_id: RULES[prompt[node_id]["class_type"]] for node_id in fused}
+    result: Prompt = {node_id: node | {"inputs": dict(node["inputs"])} for node_id, node in prompt.items()}
+    uploads: dict[tuple[str, int, str], str] = {}
+    downloads: dict[str, str] = {}
+    uploads_before = downloads_before = 0
+
+    # replace high level nodes by their low level counterpart, keeping the node ids
+    for node_id in sorted(fused):
+        node, rule = result[node_id], rules[node_id]
+        for name, upload in rule.uploads.items():
+            value = node["inputs"].get(name)
+            if not is_link(value):
+                continue
+            uploads_before += 1
+            if value[0] in fused:
+                continue  # the input already is the state id output by the low level node
+            key = (value[0], value[1], upload)
+            if key not in uploads:
+                uploads[key] = f"{value[0]}.{value[1]}.fg_upload"
+                result[uploads[key]] = {
+                    "class_type": upload,
+                    "inputs": {UPLOAD_INPUTS[upload]: value},
+                }
+            node["inputs"][name] = [uploads[key], 0]
+        if rule.download is not None:
+            downloads_before += 1
+        node["class_type"] = rule.low_level
+
+    # materialize tensors only for the consumers outside of the chains
+    for node_id, node in result.items():
+        if node_id in fused:
+            continue
+        for name, value in node["inputs"].items():
+            if not is_link(value) or value[0] not in fused:
+                continue
+            download = rules[value[0]].download
+            if download is None:
+                continue
+            if value[0] not in downloads:
+                downloads[value[0]] = f"{value[0]}.fg_download"
+            node["inputs"][name] = [downloads[value[0]], 0]
+
+    for source, download_id in downloads.items():
+        download = rules[source].download
+        assert download is not None
+        result[download_id] = {
+            "class_type": download,
+            "inputs": {
+                DOWNLOAD_INPUTS[download]: [source, 0],
+                "image_format": "AUTO",
+                "resolution": "FULL",
+            },
+        }
+
+    logger.info(
+        f"fused {len(fused)} Finegrain nodes: "
+        f"uploads {uploads_before} -> {len(uploads)}, downloads {downloads_before} -> {len(downloads)}"
+    )
+    return result
+
+
+def on_prompt(json_data: dict[str, Any]) -> dict[str, Any]:
+    try:
+        enabled = _get_config().getboolean("finegrain", "fuse_nodes", fallback=False)
+    except FileNotFoundError:
+        enabled = False
+    if enabled and "prompt" in json_data:
+        json_data["prompt"] = fuse_prompt(json_data["prompt"])
+    return json_data
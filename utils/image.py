@@ -2,7 +2,7 @@ from typing import Any
 
 import numpy as np
 import torch
-from PIL import Image
+from PIL import Image, ImageColor
 
 
 def tensor_to_image(tensor: torch.Tensor) -> Image.Image:
@@ -27,8 +27,13 @@ def tensor_to_image(tensor: torch.Tensor) -> Image.Image:
 
 
 def image_to_tensor(image: Image.Image) -> torch.Tensor:
-    array = np.array(image).astype(np.float32) / 255.0
-    tensor = torch.tensor(array, dtype=torch.float32)
+    if image.mode == "1":
+        image = image.convert("L")
+    array = torch.from_numpy(np.array(image))  # type: ignore[reportUnknownMemberType]
+
+    # convert straight into the output tensor, without float intermediates
+    tensor = torch.empty(array.shape, dtype=torch.float32)
+    tensor.copy_(array).div_(255.0)
 
     assert isinstance(image.mode, str)  # type: ignore
     match image.mode:
@@ -42,6 +47,39 @@ def image_to_tensor(image: Image.Image) -> torch.Tensor:
     return tensor.unsqueeze(0)
 
 
+def downscale(image: Image.Image, max_side: int) -> Image.Image:
+    scale = max_side / max(image.size)
+    if max_side <= 0 or scale >= 1:
+        return image
+    size = (max(round(image.width * scale), 1), max(round(image.height * scale), 1))
+    return image.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+
+
+def is_empty_mask(mask: torch.Tensor) -> bool:
+    # values under 1/255 are quantized to zero when converted to an image
+    return mask.numel() == 0 or bool(mask.amax() < 1 / 255)
+
+
+def parse_color(color: str) -> tuple[int, int, int] | None:
+    # only opaque colors, the ones PIL can't parse or with an alpha channel return None
+    try:
+        rgb = ImageColor.getrgb(color)
+    except ValueError:
+        return None
+    if len(rgb) != 3:
+        return None
+    return rgb
+
+
+def composite_background(image: torch.Tensor, color: tuple[int, int, int]) -> torch.Tensor:
+    assert image.ndim == 4, f"Expected 4D tensor, got {image.ndim}D"
+    assert image.shape[-1] == 4, "Image must be in RGBA mode"
+
+    background = torch.tensor(color, dtype=image.dtype, device=image.device) / 255
+    rgb, alpha = image[..., :3], image[..., 3:]
+    return torch.lerp(background.expand_as(rgb), rgb, alpha)
+
+
 class ApplyTransparencyMask:
     @classmethod
     def INPUT_TYPES(cls) -> dict[str, Any]:
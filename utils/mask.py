@@ -0,0 +1,87 @@
+import io
+import time
+from collections.abc import Callable
+
+import numpy as np
+import torch
+from PIL import Image
+
+from .image import tensor_to_image
+
+
+def is_binary(array: np.ndarray) -> bool:
+    return bool(np.logical_or(array == 0, array == 255).all())
+
+
+def image_to_mask(image: Image.Image) -> torch.Tensor:
+    # compact (1, H, W) uint8 mask, 4 times smaller than the float32 MASK tensors
+    if image.mode != "L":
+        image = image.convert("L")
+    return torch.from_numpy(np.array(image)).unsqueeze(0)  # type: ignore[reportUnknownMemberType]
+
+
+def expand_mask(mask: torch.Tensor) -> torch.Tensor:
+    # compact masks are only turned into MASK tensors when handed over to ComfyUI
+    if mask.is_floating_point():
+        return mask
+    return mask.to(torch.float32) / 255
+
+
+def compact_mask(mask: torch.Tensor) -> torch.Tensor | None:
+    # the uint8 mask holding the exact same values, if there is one
+    if mask.dtype != torch.float32:
+        return None
+    compact = (mask * 255).round_().clamp_(0, 255).to(torch.uint8)
+    if not torch.equal(compact.to(torch.float32) / 255, mask):
+        return None
+    return compact
+
+
+def union(mask: torch.Tensor) -> torch.Tensor:
+    # merge a batch of masks into a single one, locally: cheaper than uploading them all to merge them
+    if mask.shape[0] == 1:
+        return mask
+    return mask.amax(dim=0, keepdim=True)
+
+
+def mask_to_image(mask: torch.Tensor) -> Image.Image:
+    # binary masks are packed 8 pixels per byte, which PNG compresses a lot better and faster
+    assert mask.ndim == 3, f"Expected 3D tensor, got {mask.ndim}D"
+    assert mask.shape[0] == 1, f"Expected batch size of 1, got {mask.shape[0]}"
+
+    image = tensor_to_image(mask.unsqueeze(0))
+    array = np.asarray(image)
+    if not is_binary(array):
+        return image
+    packed = np.packbits(array, axis=1)
+    return Image.frombytes("1", image.size, packed.tobytes())
+
+
+def benchmark() -> None:
+    def encode(image: Image.Image) -> tuple[float, int]:
+        # same encoding as the uploads, a single run as 8-bit noise takes seconds
+        data = io.BytesIO()
+        start = time.perf_counter()
+        image.save(data, format="PNG", optimize=True)
+        return (time.perf_counter() - start) * 1000, data.tell()
+
+    def ellipse(side: int) -> torch.Tensor:
+        y, x = torch.meshgrid(torch.linspace(-1, 1, side), torch.linspace(-1, 1, side), indexing="ij")
+        return (x**2 + (1.5 * y) ** 2 < 0.5).float().unsqueeze(0)
+
+    def noise(side: int) -> torch.Tensor:
+        return (torch.rand(1, side, side) > 0.5).float()
+
+    shapes: dict[str, Callable[[int], torch.Tensor]] = {"ellipse": ellipse, "noise": noise}
+    print(f"{'mask':>16} {'L bytes':>10} {'L time':>9} {'1 bytes':>10} {'1 time':>9}")
+    for name, shape in shapes.items():
+        for side in (1024, 2048, 4096):
+            mask = shape(side)
+            l_time, l_size = encode(tensor_to_image(mask.unsqueeze(0)))
+            b_time, b_size = encode(mask_to_image(mask))
+            print(f"{f'{name} {side}':>16} {l_size:>10} {l_time:>7.1f}ms {b_size:>10} {b_time:>7.1f}ms")
+
+
+if __name__ == "__main__":
+    # python -m utils.mask
+    benchmark()
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from PIL import Image, ImageOps
+
+from ..high_level.blender import Blender as HighLevelBlender
+from ..high_level.blender_sweep import BlenderSweep as HighLevelBlenderSweep
+from ..high_level.box import Box as HighLevelBox
+from ..high_level.box_multiple import BoxMultiple as HighLevelBoxMultiple
+from ..high_level.eraser import Eraser as HighLevelEraser
+from ..high_level.name import InferMainSubject as HighLevelInferMainSubject
+from ..high_level.recolor import Recolor as HighLevelRecolor
+from ..high_level.recolor_multiple import RecolorMultiple as HighLevelRecolorMultiple
+from ..high_level.remove_background import RemoveBackground as HighLevelRemoveBackground
+from ..high_level.segment import Segment as HighLevelSegment
+from ..high_level.segment_multiple import SegmentMultiple as HighLevelSegmentMultiple
+from ..low_level.upload_image import UploadImage as LowLevelUploadImage
+from .context import EditorAPIContext, StateID, _create_ctx, _get_config, _get_ctx
+from .graph import Prompt, is_link
+
+logger = logging.getLogger(__name__)
+
+LOAD_IMAGE = "LoadImage"
+
+# the IMAGE inputs which are uploaded as RGB, i.e. as LoadImage outputs them
+SPECULATIVE_INPUTS: dict[str, tuple[str, ...]] = {
+    HighLevelBlender.TITLE: ("scene",),
+    HighLevelBlenderSweep.TITLE: ("scene",),
+    HighLevelBox.TITLE: ("image",),
+    HighLevelBoxMultiple.TITLE: ("image",),
+    HighLevelEraser.TITLE: ("image",),
+    HighLevelInferMainSubject.TITLE: ("image",),
+    HighLevelRecolor.TITLE: ("image",),
+    HighLevelRecolorMultiple.TITLE: ("image",),
+    HighLevelRemoveBackground.TITLE: ("image",),
+    HighLevelSegment.TITLE: ("image",),
+    HighLevelSegmentMultiple.TITLE: ("image",),
+    LowLevelUploadImage.TITLE: ("image",),
+}
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="finegrain-upload")
+_local = threading.local()
+
+
+def _thread_ctx() -> EditorAPIContext:
+    # contexts are not thread safe: each worker gets its own, recording into the shared provenance
+    if not hasattr(_local, "ctx"):
+        ctx = _create_ctx()
+        ctx.provenance = _get_ctx().provenance
+        _local.ctx = ctx
+    return _local.ctx
+
+
+def load_image(path: str) -> Image.Image | None:
+    # mirror LoadImage so that the pixels match the tensor it will output
+    image = Image.open(path)
+    if getattr(image, "n_frames", 1) > 1 or image.mode == "I":
+        return None  # batched or rescaled by LoadImage
+    image = ImageOps.exif_transpose(image)
+    return image.convert("RGB")
+
+
+async def _upload(ctx: EditorAPIContext, image: Image.Image) -> StateID:
+    if not ctx.token:
+        await ctx.login()
+    return await ctx.call_async.upload_pil_image(image, reuse=False)
+
+
+def _speculate(path: str) -> None:
+    try:
+        image = load_image(path)
+        if image is None:
+            return
+        ctx = _thread_ctx()
+        reserved = ctx.provenance.reserve(image)
+        if reserved is None:
+            return  # already uploaded, or being uploaded
+        key, future = reserved
+        try:
+            state_id = asyncio.run(_upload(ctx, image))
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(state_id)
+        finally:
+            ctx.provenance.resolve(key, future)
+        logger.debug(f"uploaded {path} ahead of time as {state_id}")
+    except Exception as e:
+        logger.warning(f"failed to upload {path} ahead of time: {e}")
+
+
+def find_uploads(prompt: Prompt) -> set[str]:
+    images: set[str] = set()
+    for node in prompt.values():
+        for name in SPECULATIVE_INPUTS.get(node.get("class_type", ""), ()):
+            value = node["inputs"].get(name)
+            if not is_link(value) or value[0] not in prompt:
+                continue
+            source = prompt[value[0]]
+            if source.get("class_type") == LOAD_IMAGE and value[1] == 0:
+                images.add(source["inputs"]["image"])
+    return images
+
+
+def on_prompt(json_data: dict[str, Any]) -> dict[str, Any]:
+    try:
+        enabled = _get_config().getboolean("finegrain", "speculative_uploads", fallback=False)
+    except FileNotFoundError:
+        enabled = False
+    if not enabled or "prompt" not in json_data:
+        return json_data
+
+    try:
+        import folder_paths  # type: ignore
+    except ImportError:  # not running inside ComfyUI
+        return json_data
+
+    for image in find_uploads(json_data["prompt"]):
+        if folder_paths.exists_annotated_filepath(image):  # type: ignore
+            _executor.submit(_speculate, folder_paths.get_annotated_filepath(image))  # type: ignore
+    return json_data
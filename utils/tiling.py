@@ -0,0 +1,98 @@
+import math
+from collections.abc import Awaitable, Callable
+from functools import cache
+
+import torch
+
+from .bbox import BoundingBox, crop, is_degenerate
+from .context import EditorAPIContext, _get_config
+
+
+@cache
+def get_tiling() -> tuple[int, int]:
+    try:
+        config = _get_config()
+        tile_size = config.getint("finegrain", "tile_size", fallback=4096)
+        tile_overlap = config.getint("finegrain", "tile_overlap", fallback=256)
+    except FileNotFoundError:
+        tile_size, tile_overlap = 4096, 256
+    assert 0 <= 2 * tile_overlap < tile_size, "tile_overlap must be less than half of tile_size"
+    return tile_size, tile_overlap
+
+
+def intersect(bbox: BoundingBox, other: BoundingBox) -> BoundingBox | None:
+    r = (max(bbox[0], other[0]), max(bbox[1], other[1]), min(bbox[2], other[2]), min(bbox[3], other[3]))
+    return None if is_degenerate(r) else r
+
+
+def translate(bbox: BoundingBox, dx: int, dy: int) -> BoundingBox:
+    return (bbox[0] + dx, bbox[1] + dy, bbox[2] + dx, bbox[3] + dy)
+
+
+def _spans(start: int, length: int, tile_size: int, overlap: int) -> list[tuple[int, int]]:
+    if length <= tile_size:
+        return [(start, start + length)]
+    # evenly spread the tiles, so that they overlap by at least `overlap`
+    count = math.ceil((length - overlap) / (tile_size - overlap))
+    step = (length - tile_size) / (count - 1)
+    return [(start + round(i * step), start + round(i * step) + tile_size) for i in range(count)]
+
+
+def plan_tiles(region: BoundingBox, tile_size: int, overlap: int) -> list[BoundingBox]:
+    xs = _spans(region[0], region[2] - region[0], tile_size, overlap)
+    ys = _spans(region[1], region[3] - region[1], tile_size, overlap)
+    return [(x0, y0, x1, y1) for y0, y1 in ys for x0, x1 in xs]
+
+
+def _ramp(length: int, overlap: int) -> torch.Tensor:
+    # weights fading in and out over `overlap` pixels on both ends, never reaching zero
+    if overlap == 0:
+        return torch.ones(length)
+    x = torch.arange(length, dtype=torch.float32) + 0.5
+    return torch.minimum(x, length - x).clamp(max=overlap) / overlap
+
+
+def blend_tiles(
+    base: torch.Tensor,
+    tiles: list[BoundingBox],
+    results: list[torch.Tensor | None],
+    overlap: int,
+) -> torch.Tensor:
+    # blend the tile results into a copy of base, a None result keeps base as is for this tile
+    region = (
+        min(t[0] for t in tiles),
+        min(t[1] for t in tiles),
+        max(t[2] for t in tiles),
+        max(t[3] for t in tiles),
+    )
+    accumulator = torch.zeros_like(crop(base, region), dtype=torch.float32)
+    weights = torch.zeros(region[3] - region[1], region[2] - region[0])
+    trailing = (1,) * (base.ndim - 3)  # channels of IMAGE tensors
+
+    for tile, result in zip(tiles, results, strict=True):
+        if result is None:
+            result = crop(base, tile)
+        weight = _ramp(tile[3] - tile[1], overlap)[:, None] * _ramp(tile[2] - tile[0], overlap)[None, :]
+        local = translate(tile, -region[0], -region[1])
+        crop(accumulator, local).add_(result.to(torch.float32) * weight.view(*weight.shape, *trailing))
+        weights[local[1] : local[3], local[0] : local[2]] += weight
+
+    blended = accumulator / weights.view(*weights.shape, *trailing)
+    if not base.is_floating_point():
+        blended = blended.round_()  # e.g. compact uint8 masks
+    output = base.clone()
+    crop(output, region).copy_(blended)
+    return output
+
+
+async def map_tiles(
+    ctx: EditorAPIContext,
+    base: torch.Tensor,
+    region: BoundingBox,
+    process_tile: Callable[[BoundingBox], Awaitable[torch.Tensor | None]],
+) -> torch.Tensor:
+    # process the region of base tile by tile, concurrently, and blend the results back together
+    tile_size, overlap = get_tiling()
+    tiles = plan_tiles(region, tile_size, overlap)
+    results = await ctx.gather(*(process_tile(tile) for tile in tiles))
+    return blend_tiles(base, tiles, results, overlap)